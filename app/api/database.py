@@ -1,7 +1,9 @@
 """
 Database connection module for FastAPI
 """
+import asyncio
 import psycopg2
+import asyncpg
 from psycopg2.extras import RealDictCursor
 from typing import Generator, Dict, Any, List
 import logging
@@ -103,6 +105,33 @@ class DatabaseManager:
             if conn:
                 conn.close()
 
+    async def execute_query_counts_async(self, queries: List[str]) -> List[int]:
+        """
+        Execute independent count queries concurrently on separate connections
+        
+        Args:
+            queries: SQL count queries to execute
+            
+        Returns:
+            Counts in the same order as the queries
+        """
+        try:
+            # One short-lived connection per query: callers run this under asyncio.run,
+            # so nothing could be reused across calls anyway, and a pool would only
+            # add its own setup on top of the same connections
+            async def fetch_count(query: str) -> int:
+                conn = await asyncpg.connect(**self.connection_params)
+                try:
+                    result = await conn.fetchval(query)
+                    return result if result is not None else 0
+                finally:
+                    await conn.close()
+            
+            return list(await asyncio.gather(*(fetch_count(query) for query in queries)))
+        except Exception as e:
+            logger.error(f"Query execution error: {e}")
+            raise
+
 # Global database manager instance
 db = DatabaseManager()
 
@@ -147,9 +147,12 @@ ADDITIONAL_MEDICAL_CHANNELS = [
     }
 ]
 
+# All configured channels
+TELEGRAM_CHANNELS = ETHIOPIAN_MEDICAL_CHANNELS + ADDITIONAL_MEDICAL_CHANNELS
+
 def get_all_channels() -> List[Dict[str, Any]]:
     """Get all configured channels"""
-    return ETHIOPIAN_MEDICAL_CHANNELS + ADDITIONAL_MEDICAL_CHANNELS
+    return list(TELEGRAM_CHANNELS)
 
 def get_active_channels() -> List[Dict[str, Any]]:
     """Get only active channels"""
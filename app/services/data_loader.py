@@ -1,15 +1,21 @@
 """
 Data Loader Service for Populating Data Lake
 """
+import io
+import os
 import json
 import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
 
+import orjson
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
@@ -26,29 +32,114 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Message files are small, so reads are latency-bound; keep several in flight
+READ_WORKERS = 16
+
+# Session settings for index builds: sort in memory and with parallel workers
+INDEX_BUILD_SETTINGS = {
+    'maintenance_work_mem': '2GB',
+    'max_parallel_maintenance_workers': '4'
+}
+
+# Column limits in init.sql; out-of-range values would fail the whole COPY
+BIGINT_MAX = 2 ** 63 - 1
+INTEGER_MAX = 2 ** 31 - 1
+
+def _copy_line(*values) -> str:
+    """
+    Format one CSV line for COPY
+    
+    None is written as an unquoted empty field, which is CSV COPY's NULL, and every
+    string is quoted, so no text value (not even '' or '\\N') can be read back as NULL.
+    """
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append('')
+        elif isinstance(value, bool):
+            fields.append('t' if value else 'f')
+        elif isinstance(value, int):
+            fields.append(str(value))
+        else:
+            fields.append('"' + str(value).replace('"', '""') + '"')
+    return ','.join(fields) + '\n'
+
+def _to_int(value: Any, limit: int = BIGINT_MAX) -> Optional[int]:
+    """Coerce an id or size to int, raising ValueError if it doesn't fit the column"""
+    if value is None or value == '':
+        return None
+    number = int(value)
+    if not -limit - 1 <= number <= limit:
+        raise ValueError(f"{value} is out of range")
+    return number
+
+def _to_timestamp(value: Any) -> Optional[str]:
+    """Check a message date parses, raising ValueError otherwise"""
+    if value is None or value == '':
+        return None
+    return datetime.fromisoformat(str(value)).isoformat()
+
 class DataLoader:
     """Data loader for populating PostgreSQL data lake"""
     
-    def __init__(self):
-        """Initialize the data loader"""
+    def __init__(self, pool: Optional[ThreadedConnectionPool] = None):
+        """
+        Initialize the data loader
+        
+        Args:
+            pool: Connection pool to share with the caller (optional); by default
+                the loader creates and owns its own
+        """
         self.engine = create_engine(settings.database_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         self.raw_data_path = Path("data/raw/telegram_messages")
+        self._owns_pool = pool is None
+        self.pool = pool or ThreadedConnectionPool(minconn=1, maxconn=4, **self._connection_params())
+        
+    def _connection_params(self) -> Dict[str, Any]:
+        """Connection settings for the data lake database"""
+        return {
+            'host': settings.database_url.split('@')[1].split(':')[0],
+            'database': settings.postgres_db,
+            'user': settings.postgres_user,
+            'password': settings.postgres_password
+        }
         
     def _get_connection(self):
         """Get database connection"""
-        return psycopg2.connect(
-            host=settings.database_url.split('@')[1].split(':')[0],
-            database=settings.postgres_db,
-            user=settings.postgres_user,
-            password=settings.postgres_password
-        )
+        return psycopg2.connect(**self._connection_params())
+        
+    @contextmanager
+    def _pooled_connection(self):
+        """Borrow a connection from the pool and hand it back in its default state"""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            try:
+                if not conn.closed:
+                    # End any open read transaction first; autocommit can't be
+                    # switched while one is in progress
+                    conn.rollback()
+                    if conn.autocommit:
+                        conn.autocommit = False
+            finally:
+                self.pool.putconn(conn, close=bool(conn.closed))
+            
+    def close(self):
+        """Close pooled connections if this loader created the pool"""
+        if self._owns_pool and not self.pool.closed:
+            self.pool.closeall()
         
     def load_raw_messages(self, file_path: Path) -> List[Dict[str, Any]]:
         """Load raw messages from JSON file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            raw = file_path.read_bytes()
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # NaN/Infinity are valid for the json module but not for orjson
+                data = json.loads(raw)
                 
             messages = data.get('messages', [])
             logger.info(f"Loaded {len(messages)} messages from {file_path}")
@@ -119,30 +210,135 @@ class DataLoader:
             conn.rollback()
             return None
             
+    def _coerce_message(self, message_data: Dict[str, Any]) -> Tuple[Tuple, Optional[Tuple]]:
+        """Build a message's column values and its media's (if any), raising ValueError on bad fields"""
+        media = message_data.get('media')
+        sender_info = message_data.get('sender_info')
+        message_values = (
+            _to_int(message_data.get('id')),
+            _to_int(message_data.get('channel_id')),
+            message_data.get('channel_name'),
+            _to_int(message_data.get('sender_id')),
+            sender_info.get('username') if sender_info else None,
+            message_data.get('text'),
+            _to_timestamp(message_data.get('date')),
+            bool(media),
+            media.get('type') if media else None,
+            None  # media_url will be populated later
+        )
+        media_values = None
+        if media:
+            media_values = (
+                media.get('file_id'),
+                None,  # file_unique_id
+                _to_int(media.get('file_size'), INTEGER_MAX),
+                None,  # file_path
+                media.get('mime_type'),
+                None   # local_path
+            )
+        return message_values, media_values
+        
+    def copy_raw_messages(self, conn, messages: List[Dict[str, Any]]) -> int:
+        """
+        Bulk load messages and their media with COPY in a single transaction
+        
+        Media rows reference the message's serial id, so ids are drawn from the
+        sequence up front and written explicitly instead of being returned per row.
+        Messages with fields that don't fit their columns are skipped; if the COPY
+        still fails, the batch is retried row by row so one bad row can't sink it.
+        
+        Args:
+            conn: Database connection
+            messages: Raw message dicts as saved by the scraper
+            
+        Returns:
+            Number of messages loaded
+        """
+        valid = []
+        for message_data in messages:
+            try:
+                valid.append((message_data, *self._coerce_message(message_data)))
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.error(f"Skipping message {message_data.get('id')}: {e}")
+        if not valid:
+            return 0
+            
+        try:
+            with conn.cursor() as cursor:
+                # Losing the last few ms of a re-runnable load on a crash is
+                # acceptable, so don't wait for the WAL flush on commit
+                cursor.execute("SET LOCAL synchronous_commit = off")
+                
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence('raw_telegram_messages', 'id')) "
+                    "FROM generate_series(1, %s)",
+                    (len(valid),)
+                )
+                row_ids = [row[0] for row in cursor.fetchall()]
+                
+                message_buffer = io.StringIO()
+                media_buffer = io.StringIO()
+                for row_id, (_, message_values, media_values) in zip(row_ids, valid):
+                    message_buffer.write(_copy_line(row_id, *message_values))
+                    if media_values:
+                        media_buffer.write(_copy_line(row_id, *media_values))
+                
+                message_buffer.seek(0)
+                cursor.copy_expert("""
+                    COPY raw_telegram_messages (
+                        id, message_id, chat_id, chat_title, sender_id, sender_username,
+                        message_text, message_date, has_media, media_type, media_url
+                    ) FROM STDIN WITH (FORMAT csv)
+                """, message_buffer)
+                
+                media_buffer.seek(0)
+                cursor.copy_expert("""
+                    COPY raw_telegram_media (
+                        message_id, file_id, file_unique_id, file_size,
+                        file_path, mime_type, local_path
+                    ) FROM STDIN WITH (FORMAT csv)
+                """, media_buffer)
+                
+            conn.commit()
+            return len(valid)
+            
+        except Exception as e:
+            logger.error(f"❌ Error copying {len(valid)} messages, inserting them one by one: {e}")
+            conn.rollback()
+            return self._insert_messages(conn, [message_data for message_data, _, _ in valid])
+            
+    def _insert_messages(self, conn, messages: List[Dict[str, Any]]) -> int:
+        """Insert messages and their media row by row, skipping rows the database rejects"""
+        processed_count = 0
+        for message_data in messages:
+            message_id = self.insert_raw_message(conn, message_data)
+            if message_id is None:
+                continue
+            if message_data.get('media'):
+                self.insert_raw_media(conn, message_data['media'], message_id)
+            processed_count += 1
+        return processed_count
+            
     def process_channel_data(self, channel_path: Path) -> int:
         """Process all data files for a channel"""
         processed_count = 0
         
         try:
-            conn = self._get_connection()
+            # Read the channel's files in parallel and COPY each one as it arrives,
+            # so a failure only costs that file's transaction
+            with os.scandir(channel_path) as entries:
+                json_files = [
+                    Path(entry.path) for entry in entries
+                    if entry.name.endswith('.json') and entry.is_file()
+                ]
             
-            # Process each JSON file in the channel directory
-            for json_file in channel_path.glob("*.json"):
-                logger.info(f"Processing file: {json_file}")
-                
-                messages = self.load_raw_messages(json_file)
-                
-                for message_data in messages:
-                    # Insert raw message
-                    message_id = self.insert_raw_message(conn, message_data)
-                    
-                    if message_id and message_data.get('media'):
-                        # Insert media information
-                        self.insert_raw_media(conn, message_data['media'], message_id)
-                        
-                    processed_count += 1
+            if json_files:
+                with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor, \
+                        self._pooled_connection() as conn:
+                    for file_messages in executor.map(self.load_raw_messages, json_files):
+                        if file_messages:
+                            processed_count += self.copy_raw_messages(conn, file_messages)
                     
-            conn.close()
             logger.info(f"Processed {processed_count} messages from {channel_path}")
             
         except Exception as e:
@@ -178,9 +374,7 @@ class DataLoader:
     def get_loading_stats(self) -> Dict[str, Any]:
         """Get statistics about the data loading process"""
         try:
-            conn = self._get_connection()
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            with self._pooled_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 # Count raw messages
                 cursor.execute("SELECT COUNT(*) as count FROM raw_telegram_messages")
                 message_count = cursor.fetchone()['count']
@@ -201,8 +395,6 @@ class DataLoader:
                     FROM raw_telegram_messages
                 """)
                 date_range = cursor.fetchone()
-                
-            conn.close()
             
             return {
                 "total_messages": message_count,
@@ -218,25 +410,53 @@ class DataLoader:
             logger.error(f"Error getting loading stats: {e}")
             return {}
             
+    def _create_table_indexes(self, index_statements: List[Tuple[str, str]]):
+        """Build one table's indexes without blocking writes to it"""
+        with self._pooled_connection() as conn:
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block,
+            # so settings are applied to the session and reset afterwards
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for name, value in INDEX_BUILD_SETTINGS.items():
+                    cursor.execute("SELECT set_config(%s, %s, false)", (name, value))
+                
+                try:
+                    for index_name, index_sql in index_statements:
+                        # A failed concurrent build leaves an invalid index behind,
+                        # which IF NOT EXISTS would otherwise keep forever
+                        cursor.execute(
+                            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+                            (index_name,)
+                        )
+                        row = cursor.fetchone()
+                        if row and not row[0]:
+                            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+                        cursor.execute(index_sql)
+                        logger.info(f"Index ready: {index_name}")
+                finally:
+                    # Don't hand the pool a connection with 2GB of maintenance memory
+                    if not conn.closed:
+                        cursor.execute("RESET ALL")
+            
     def create_data_lake_indexes(self):
         """Create indexes for better query performance"""
         try:
-            conn = self._get_connection()
-            
-            with conn.cursor() as cursor:
-                # Create indexes if they don't exist
-                indexes = [
-                    "CREATE INDEX IF NOT EXISTS idx_raw_messages_chat_id ON raw_telegram_messages(chat_id)",
-                    "CREATE INDEX IF NOT EXISTS idx_raw_messages_date ON raw_telegram_messages(message_date)",
-                    "CREATE INDEX IF NOT EXISTS idx_raw_messages_sender ON raw_telegram_messages(sender_id)",
-                    "CREATE INDEX IF NOT EXISTS idx_raw_media_message_id ON raw_telegram_media(message_id)"
+            # Concurrent builds on the same table queue behind each other, so
+            # build each table's indexes on its own connection in parallel
+            table_indexes = [
+                [
+                    ("idx_raw_messages_chat_id", "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_messages_chat_id ON raw_telegram_messages(chat_id)"),
+                    ("idx_raw_messages_date", "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_messages_date ON raw_telegram_messages(message_date)"),
+                    ("idx_raw_messages_sender", "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_messages_sender ON raw_telegram_messages(sender_id)")
+                ],
+                [
+                    ("idx_raw_media_message_id", "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_media_message_id ON raw_telegram_media(message_id)")
                 ]
+            ]
+            
+            with ThreadPoolExecutor(max_workers=len(table_indexes)) as executor:
+                list(executor.map(self._create_table_indexes, table_indexes))
                 
-                for index_sql in indexes:
-                    cursor.execute(index_sql)
-                    
-            conn.commit()
-            conn.close()
             logger.info("Created data lake indexes")
             
         except Exception as e:
@@ -256,6 +476,7 @@ def main():
     # Get final stats
     final_stats = loader.get_loading_stats()
     logger.info(f"Final stats: {final_stats}")
+    loader.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Content-addressed cache of YOLO detection results
+"""
+import os
+import mmap
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+class DetectionCache:
+    """Map image content hashes to detection files produced for identical images"""
+
+    def __init__(self, fingerprint: str, index_path: Optional[Path] = None):
+        """
+        Initialize the detection cache
+
+        Args:
+            fingerprint: Model settings the results depend on (e.g. "yolov8n:0.25")
+            index_path: JSON index file (default: ~/.cache/tg-pipeline/yolo_detections_v1.json)
+        """
+        self.fingerprint = fingerprint
+        self.index_path = index_path or Path.home() / ".cache" / "tg-pipeline" / "yolo_detections_v1.json"
+        self.index: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            self.index = orjson.loads(self.index_path.read_bytes())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable detection cache {self.index_path}: {e}")
+
+    def key(self, image_path: Path) -> str:
+        """Build the cache key from the model fingerprint and the image's SHA-256"""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    digest.update(data)
+        return f"{self.fingerprint}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Get the cached detection data for a key, or None if missing or its file is gone"""
+        detection_file = self.index.get(key)
+        if detection_file:
+            try:
+                data = orjson.loads(Path(detection_file).read_bytes())
+                self.hits += 1
+                return data
+            except (OSError, orjson.JSONDecodeError):
+                del self.index[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, detection_file: Path):
+        """Record the detection file produced for a key"""
+        self.index[key] = str(detection_file.resolve())
+
+    def save(self):
+        """Write the index to disk atomically"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_bytes(orjson.dumps(self.index))
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"💾 Detection cache: {self.hits} hits, {self.misses} misses")
@@ -1,37 +1,83 @@
 """
 YOLO Image Detection Service for Telegram Medical Data Pipeline
 """
-import sys
+import io
 import os
+import queue
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
-import json
 
-# Add project root to path
-sys.path.append(str(Path(__file__).parent.parent.parent))
+import orjson
 
 from app.core.config import settings
+from app.services.detection_cache import DetectionCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 32
+IMAGE_SIZE = 640
+READ_WORKERS = 4
+# Batches buffered between the decode, inference and write stages
+QUEUE_DEPTH = 2
+PRECISIONS = ('fp32', 'fp16', 'int8')
+# Small dataset used to calibrate INT8 engines (ultralytics downloads it on first use)
+CALIBRATION_DATA = 'coco8.yaml'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+def _iter_images(root: Path) -> Iterator[Path]:
+    """
+    Walk a directory tree with os.scandir and yield image files
+    
+    DirEntry.is_dir() answers from the directory listing itself and only
+    falls back to a stat call when the filesystem doesn't report the type.
+    """
+    pending = deque([root])
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield Path(entry.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Cannot scan {directory}: {e}")
+
 class YOLODetector:
     """YOLO-based image detection service"""
     
-    def __init__(self, model_size: str = "n", confidence_threshold: float = 0.25):
+    def __init__(self, model_size: str = "n", confidence_threshold: float = 0.25,
+                 detection_cache: Optional[DetectionCache] = None, precision: str = "fp16",
+                 batch_size: int = BATCH_SIZE, calibration_data: str = CALIBRATION_DATA):
         """
         Initialize YOLO detector
         
         Args:
             model_size: Model size ('n', 's', 'm', 'l', 'x')
             confidence_threshold: Minimum confidence score for detections
+            detection_cache: Cache of results for previously seen image content (optional)
+            precision: Inference precision ('fp32', 'fp16', 'int8'); fp16 and int8 need a GPU.
+                Updated by load_model to the precision actually used
+            batch_size: Images per model call; also the largest batch an INT8 engine accepts
+            calibration_data: Dataset YAML used to calibrate INT8 engines
         """
         self.model_size = model_size
         self.confidence_threshold = confidence_threshold
+        self.precision = precision
+        self.batch_size = batch_size
+        self.calibration_data = calibration_data
+        self.detection_cache = detection_cache
         self.model = None
+        self.device = 'cpu'
+        self.half = False
         self.media_path = Path("data/raw/media")
         self.detections_path = Path("data/enriched/detections")
         self.detections_path.mkdir(parents=True, exist_ok=True)
@@ -50,16 +96,60 @@ class YOLODetector:
             'gloves', 'hospital', 'clinic', 'pharmacy', 'medical', 'health'
         }
         
+    def _int8_engine(self, model_name: str) -> Path:
+        """Get the INT8 TensorRT engine for the model, exporting it on first use"""
+        from ultralytics import YOLO
+        
+        # The engine's maximum batch and calibration set are baked in at export
+        calibration = Path(self.calibration_data).stem
+        engine_path = Path(model_name).with_name(
+            f"{Path(model_name).stem}_int8_b{self.batch_size}_{calibration}.engine"
+        )
+        if engine_path.exists():
+            return engine_path
+        
+        logger.info(f"🔄 Exporting INT8 TensorRT engine for {model_name} (one-time)...")
+        exported = YOLO(model_name).export(
+            format='engine',
+            int8=True,
+            dynamic=True,
+            batch=self.batch_size,
+            imgsz=IMAGE_SIZE,
+            data=self.calibration_data
+        )
+        Path(exported).replace(engine_path)
+        logger.info(f"💾 Saved TensorRT engine to {engine_path}")
+        return engine_path
+    
     def load_model(self):
         """Load YOLO model"""
         try:
             # Import ultralytics (will fail if not installed)
             from ultralytics import YOLO
+            import torch
             
-            # Load pre-trained model
             model_name = f"yolov8{self.model_size}.pt"
-            self.model = YOLO(model_name)
-            logger.info(f"✅ YOLO model loaded: {model_name}")
+            precision = self.precision
+            if precision != 'fp32' and not torch.cuda.is_available():
+                logger.warning(f"⚠️ {precision} needs a CUDA GPU, falling back to fp32 on CPU")
+                precision = 'fp32'
+            else:
+                self.device = 0 if torch.cuda.is_available() else 'cpu'
+            # Record what actually runs, for detection metadata and cache keys
+            self.precision = precision
+            
+            if precision == 'int8':
+                # TensorRT engines are already fused and quantized
+                model_name = str(self._int8_engine(model_name))
+                self.model = YOLO(model_name, task='detect')
+            else:
+                # Load pre-trained model and fuse conv + batchnorm layers once
+                # rather than on every predict call
+                self.model = YOLO(model_name)
+                self.model.fuse()
+                self.half = precision == 'fp16'
+            
+            logger.info(f"✅ YOLO model loaded: {model_name} ({precision}, device: {self.device})")
             return True
             
         except ImportError:
@@ -69,58 +159,97 @@ class YOLODetector:
             logger.error(f"❌ Error loading YOLO model: {e}")
             return False
     
-    def detect_objects(self, image_path: Path) -> List[Dict[str, Any]]:
+    def _extract_detections(self, result, scale: float = 1.0) -> List[Dict[str, Any]]:
+        """Convert one ultralytics result into detection dicts, scaling boxes back to the source image"""
+        detections = []
+        boxes = result.boxes
+        if boxes is not None:
+            for box in boxes:
+                # Get detection data
+                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy() * scale
+                confidence = float(box.conf[0].cpu().numpy())
+                class_id = int(box.cls[0].cpu().numpy())
+                class_name = result.names[class_id]
+                
+                detection = {
+                    'class_id': class_id,
+                    'class_name': class_name,
+                    'confidence': confidence,
+                    'bbox': {
+                        'x1': float(x1),
+                        'y1': float(y1),
+                        'x2': float(x2),
+                        'y2': float(y2)
+                    },
+                    'area': float((x2 - x1) * (y2 - y1)),
+                    'is_medical_related': class_name in self.medical_objects,
+                    'detection_time': datetime.now().isoformat()
+                }
+                
+                detections.append(detection)
+        return detections
+    
+    def detect_objects_batch(self, images: List[Any], names: List[str],
+                             scales: Optional[List[float]] = None) -> Optional[List[List[Dict[str, Any]]]]:
         """
-        Detect objects in an image
+        Detect objects in several images with a single model call
         
         Args:
-            image_path: Path to the image file
+            images: Decoded images (numpy arrays) or image paths
+            names: Image names, used for logging
+            scales: Factor from each decoded image back to its source resolution (default: 1.0)
             
         Returns:
-            List of detected objects with metadata
+            List of detections for each image, in input order, or None if inference failed
         """
         if not self.model:
             logger.error("❌ YOLO model not loaded")
+            return None
+        
+        if not images:
             return []
         
         try:
-            # Run inference
-            results = self.model(image_path, conf=self.confidence_threshold)
+            import torch
             
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get detection data
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = float(box.conf[0].cpu().numpy())
-                        class_id = int(box.cls[0].cpu().numpy())
-                        class_name = result.names[class_id]
-                        
-                        detection = {
-                            'class_id': class_id,
-                            'class_name': class_name,
-                            'confidence': confidence,
-                            'bbox': {
-                                'x1': float(x1),
-                                'y1': float(y1),
-                                'x2': float(x2),
-                                'y2': float(y2)
-                            },
-                            'area': float((x2 - x1) * (y2 - y1)),
-                            'is_medical_related': class_name in self.medical_objects,
-                            'detection_time': datetime.now().isoformat()
-                        }
-                        
-                        detections.append(detection)
+            # Run inference; stream=True yields results as each batch completes
+            results = self.model.predict(
+                source=images,
+                conf=self.confidence_threshold,
+                imgsz=IMAGE_SIZE,
+                device=self.device,
+                half=self.half,
+                stream=True,
+                verbose=False
+            )
             
-            logger.info(f"🔍 Detected {len(detections)} objects in {image_path.name}")
-            return detections
+            scales = scales or [1.0] * len(images)
+            with torch.inference_mode():
+                batch_detections = [
+                    self._extract_detections(result, scale)
+                    for result, scale in zip(results, scales)
+                ]
+            
+            for name, detections in zip(names, batch_detections):
+                logger.info(f"🔍 Detected {len(detections)} objects in {name}")
+            return batch_detections
             
         except Exception as e:
-            logger.error(f"❌ Error detecting objects in {image_path}: {e}")
-            return []
+            logger.error(f"❌ Error detecting objects in batch of {len(images)} images: {e}")
+            return None
+    
+    def detect_objects(self, image_path: Path) -> List[Dict[str, Any]]:
+        """
+        Detect objects in an image
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            List of detected objects with metadata
+        """
+        batch_detections = self.detect_objects_batch([str(image_path)], [image_path.name])
+        return batch_detections[0] if batch_detections else []
     
     def analyze_image_content(self, detections: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -192,14 +321,15 @@ class YOLODetector:
                     'image_name': image_path.name,
                     'detection_time': datetime.now().isoformat(),
                     'model_used': f"yolov8{self.model_size}",
+                    'precision': self.precision,
                     'confidence_threshold': self.confidence_threshold
                 },
                 'analysis': analysis,
                 'detections': detections
             }
             
-            with open(detection_file, 'w', encoding='utf-8') as f:
-                json.dump(detection_data, f, indent=2, ensure_ascii=False)
+            with open(detection_file, 'wb') as f:
+                f.write(orjson.dumps(detection_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
             
             logger.info(f"💾 Saved detections to {detection_file}")
             return detection_file
@@ -208,6 +338,182 @@ class YOLODetector:
             logger.error(f"❌ Error saving detections for {image_path}: {e}")
             return None
     
+    def _reduced_decode_factor(self, data: bytes) -> Tuple[int, int]:
+        """
+        Pick how far libjpeg may downscale a JPEG while decoding
+        
+        The model letterboxes to IMAGE_SIZE anyway, so decoding at 1/2, 1/4 or 1/8
+        scale is free as long as the long side stays at or above IMAGE_SIZE.
+        Only the header is parsed to get the dimensions.
+        
+        Returns:
+            Reduction factor (1 for no reduction) and the source image's long side
+        """
+        from PIL import Image
+        
+        with Image.open(io.BytesIO(data)) as probe:
+            long_side = max(probe.size)
+            if probe.format != 'JPEG':
+                return 1, long_side
+        
+        for factor in (8, 4, 2):
+            if long_side / factor >= IMAGE_SIZE:
+                return factor, long_side
+        return 1, long_side
+    
+    def _read_image(self, image_path: Path) -> Tuple[Any, float]:
+        """
+        Read and decode an image file
+        
+        Returns:
+            Decoded image (None if it cannot be decoded) and the factor that maps
+            its coordinates back to the source resolution
+        """
+        import cv2
+        import numpy as np
+        
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        
+        try:
+            factor, long_side = self._reduced_decode_factor(data)
+        except Exception:
+            # Let OpenCV decode whatever the header probe couldn't identify
+            factor, long_side = 1, None
+        
+        flags = {
+            1: cv2.IMREAD_COLOR,
+            2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4,
+            8: cv2.IMREAD_REDUCED_COLOR_8
+        }
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags[factor])
+        if image is None or factor == 1:
+            return image, 1.0
+        
+        # Measure the scale from the long side: EXIF rotation can swap width and
+        # height, and libjpeg rounds odd sizes up
+        return image, long_side / max(image.shape[:2])
+    
+    def _prepare_batch(self, image_paths: List[Path], reader: ThreadPoolExecutor) -> List[Dict[str, Any]]:
+        """
+        Work out what each image in a batch needs and read the ones to run through the model
+        
+        Args:
+            image_paths: Images in the batch
+            reader: Executor used to read and decode image files
+            
+        Returns:
+            One entry per image with its status, cache key, cached data and decoded image
+        """
+        prepared = []
+        for image_path in image_paths:
+            entry = {'image_path': image_path, 'status': 'infer', 'cache_key': None,
+                     'cached': None, 'image': None}
+            prepared.append(entry)
+            
+            try:
+                # Check if image exists
+                if not image_path.exists():
+                    logger.warning(f"⚠️ Image not found: {image_path}")
+                    entry['status'] = 'skip'
+                    continue
+                
+                # Check if already processed
+                detection_file = self.detections_path / f"{image_path.stem}_detections.json"
+                if detection_file.exists():
+                    logger.info(f"⏭️ Already processed: {image_path.name}")
+                    entry['status'] = 'skip'
+                    continue
+                
+                # Reuse the results of an identical image (e.g. a repost) if cached
+                if self.detection_cache:
+                    entry['cache_key'] = self.detection_cache.key(image_path)
+                    entry['cached'] = self.detection_cache.get(entry['cache_key'])
+                    if entry['cached'] is not None:
+                        entry['status'] = 'cached'
+                        
+            except Exception as e:
+                logger.error(f"❌ Error preparing {image_path}: {e}")
+                entry['status'] = 'skip'
+        
+        to_read = [entry for entry in prepared if entry['status'] == 'infer']
+        decoded = reader.map(self._safe_read_image, [e['image_path'] for e in to_read])
+        for entry, (image, scale) in zip(to_read, decoded):
+            if image is None:
+                entry['status'] = 'skip'
+            else:
+                entry['image'] = image
+                entry['scale'] = scale
+        
+        return prepared
+    
+    def _safe_read_image(self, image_path: Path) -> Tuple[Any, float]:
+        """Read an image, logging and returning no image on failure"""
+        try:
+            image, scale = self._read_image(image_path)
+            if image is None:
+                logger.error(f"❌ Could not decode image: {image_path}")
+            return image, scale
+        except Exception as e:
+            logger.error(f"❌ Error reading {image_path}: {e}")
+            return None, 1.0
+    
+    def _finish_image(self, image_path: Path, detections: List[Dict[str, Any]],
+                      analysis: Dict[str, Any], cache_key: Optional[str],
+                      from_cache: bool) -> Dict[str, Any]:
+        """Save an image's detections and build its processing result"""
+        saved_file = self.save_detections(image_path, detections, analysis)
+        if cache_key and not from_cache and saved_file:
+            self.detection_cache.put(cache_key, saved_file)
+        
+        return {
+            'image_path': str(image_path),
+            'detection_file': str(saved_file) if saved_file else None,
+            'detections_count': len(detections),
+            'analysis': analysis,
+            'processed_at': datetime.now().isoformat()
+        }
+    
+    def _infer_batch(self, prepared: List[Dict[str, Any]]) -> Optional[List[List[Dict[str, Any]]]]:
+        """Run the model on the prepared images that need inference, in batch order; None on failure"""
+        to_infer = [entry for entry in prepared if entry['status'] == 'infer']
+        batch_detections = self.detect_objects_batch(
+            [entry['image'] for entry in to_infer],
+            [entry['image_path'].name for entry in to_infer],
+            [entry.get('scale', 1.0) for entry in to_infer]
+        )
+        # Decoded pixels aren't needed past this point; don't carry them to the writer
+        for entry in to_infer:
+            entry['image'] = None
+        return batch_detections
+    
+    def _save_batch(self, prepared: List[Dict[str, Any]],
+                    batch_detections: Optional[List[List[Dict[str, Any]]]]) -> List[Optional[Dict[str, Any]]]:
+        """Save detections for a batch and build its results; None marks a skipped or failed image"""
+        results: List[Optional[Dict[str, Any]]] = []
+        inferred = iter(batch_detections or [])
+        
+        for entry in prepared:
+            result = None
+            try:
+                # When inference failed these images stay unsaved and uncached so the next run retries them
+                if entry['status'] == 'infer' and batch_detections is not None:
+                    detections = next(inferred)
+                    result = self._finish_image(entry['image_path'], detections,
+                                                self.analyze_image_content(detections),
+                                                entry['cache_key'], from_cache=False)
+                elif entry['status'] == 'cached':
+                    detections = entry['cached'].get('detections', [])
+                    analysis = entry['cached'].get('analysis', self.analyze_image_content(detections))
+                    result = self._finish_image(entry['image_path'], detections, analysis,
+                                                entry['cache_key'], from_cache=True)
+            except Exception as e:
+                logger.error(f"❌ Error processing {entry['image_path']}: {e}")
+            results.append(result)
+        
+        return results
+    
     def process_image(self, image_path: Path) -> Optional[Dict[str, Any]]:
         """
         Process a single image: detect objects and save results
@@ -219,44 +525,100 @@ class YOLODetector:
             Processing results or None if failed
         """
         try:
-            # Check if image exists
-            if not image_path.exists():
-                logger.warning(f"⚠️ Image not found: {image_path}")
-                return None
-            
-            # Check if already processed
-            detection_file = self.detections_path / f"{image_path.stem}_detections.json"
-            if detection_file.exists():
-                logger.info(f"⏭️ Already processed: {image_path.name}")
-                return None
-            
-            # Detect objects
-            detections = self.detect_objects(image_path)
-            
-            # Analyze content
-            analysis = self.analyze_image_content(detections)
-            
-            # Save results
-            saved_file = self.save_detections(image_path, detections, analysis)
-            
-            return {
-                'image_path': str(image_path),
-                'detection_file': str(saved_file) if saved_file else None,
-                'detections_count': len(detections),
-                'analysis': analysis,
-                'processed_at': datetime.now().isoformat()
-            }
-            
+            with ThreadPoolExecutor(max_workers=1) as reader:
+                prepared = self._prepare_batch([image_path], reader)
+            return self._save_batch(prepared, self._infer_batch(prepared))[0]
         except Exception as e:
             logger.error(f"❌ Error processing {image_path}: {e}")
             return None
     
-    def scan_and_process_images(self, channel_name: str = None) -> Dict[str, Any]:
+    def _run_pipeline(self, batches: List[List[Path]], stats: Dict[str, Any]):
+        """
+        Process batches through decode, inference and write stages running side by side
+        
+        A decode thread prepares batches (skip checks, cache lookups, image decoding),
+        this thread runs the model, and a writer thread saves the results. Bounded
+        queues between them cap how many decoded batches are held in memory.
+        """
+        done = object()
+        decode_queue: queue.Queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        write_queue: queue.Queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        # Set when inference stops early (error or Ctrl+C) so the decoder doesn't block on a full queue
+        stop = threading.Event()
+        
+        def hand_off(item) -> bool:
+            while not stop.is_set():
+                try:
+                    decode_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def decode_stage(reader: ThreadPoolExecutor):
+            for batch in batches:
+                if stop.is_set():
+                    return
+                try:
+                    prepared = self._prepare_batch(batch, reader)
+                except Exception as e:
+                    logger.error(f"❌ Error preparing batch of {len(batch)} images: {e}")
+                    prepared = [{'image_path': image_path, 'status': 'skip'} for image_path in batch]
+                if not hand_off(prepared):
+                    return
+            hand_off(done)
+        
+        def write_stage():
+            while (item := write_queue.get()) is not done:
+                prepared, batch_detections = item
+                try:
+                    results = self._save_batch(prepared, batch_detections)
+                except Exception as e:
+                    logger.error(f"❌ Error saving batch of {len(prepared)} images: {e}")
+                    results = [None] * len(prepared)
+                
+                for entry, result in zip(prepared, results):
+                    if result:
+                        stats['processed_images'] += 1
+                        stats['channels_processed'].add(entry['image_path'].parent.name)
+                        stats['results'].append(result)
+                    else:
+                        stats['failed_images'] += 1
+        
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as reader:
+            decoder = threading.Thread(target=decode_stage, args=(reader,), name="yolo-decode", daemon=True)
+            writer = threading.Thread(target=write_stage, name="yolo-write", daemon=True)
+            decoder.start()
+            writer.start()
+            
+            try:
+                while (prepared := decode_queue.get()) is not done:
+                    try:
+                        batch_detections = self._infer_batch(prepared)
+                    except Exception as e:
+                        logger.error(f"❌ Error running inference on batch of {len(prepared)} images: {e}")
+                        batch_detections = None
+                    write_queue.put((prepared, batch_detections))
+            finally:
+                stop.set()
+                # Drop decoded batches nobody will run, then wait for both stages
+                while True:
+                    try:
+                        decode_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                decoder.join()
+                write_queue.put(done)
+                writer.join()
+    
+    def scan_and_process_images(self, channel_name: str = None,
+                                batch_size: Optional[int] = None) -> Dict[str, Any]:
         """
         Scan for new images and process them
         
         Args:
             channel_name: Specific channel to process (optional)
+            batch_size: Number of images passed to the model per call (default: the detector's)
             
         Returns:
             Processing statistics
@@ -271,47 +633,31 @@ class YOLODetector:
         
         try:
             # Find all image files
-            image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
-            
             if channel_name:
                 # Process specific channel
                 channel_path = self.media_path / channel_name
                 if channel_path.exists():
-                    image_files = [
-                        f for f in channel_path.rglob("*") 
-                        if f.suffix.lower() in image_extensions
-                    ]
+                    image_files = list(_iter_images(channel_path))
                 else:
                     logger.warning(f"⚠️ Channel directory not found: {channel_path}")
                     return stats
             else:
                 # Process all channels
                 image_files = []
-                for channel_dir in self.media_path.iterdir():
-                    if channel_dir.is_dir():
-                        channel_images = [
-                            f for f in channel_dir.rglob("*") 
-                            if f.suffix.lower() in image_extensions
-                        ]
-                        image_files.extend(channel_images)
+                with os.scandir(self.media_path) as channel_dirs:
+                    for channel_dir in channel_dirs:
+                        if channel_dir.is_dir():
+                            image_files.extend(_iter_images(Path(channel_dir.path)))
             
             stats['total_images'] = len(image_files)
             logger.info(f"🔍 Found {len(image_files)} images to process")
             
-            # Process each image
-            for image_path in image_files:
-                try:
-                    result = self.process_image(image_path)
-                    if result:
-                        stats['processed_images'] += 1
-                        stats['channels_processed'].add(image_path.parent.name)
-                        stats['results'].append(result)
-                    else:
-                        stats['failed_images'] += 1
-                        
-                except Exception as e:
-                    logger.error(f"❌ Error processing {image_path}: {e}")
-                    stats['failed_images'] += 1
+            batch_size = batch_size or self.batch_size
+            if self.precision == 'int8' and batch_size > self.batch_size:
+                logger.warning(f"⚠️ INT8 engine accepts at most {self.batch_size} images per batch, using that")
+                batch_size = self.batch_size
+            batches = [image_files[i:i + batch_size] for i in range(0, len(image_files), batch_size)]
+            self._run_pipeline(batches, stats)
             
             logger.info(f"✅ Processing complete: {stats['processed_images']}/{stats['total_images']} images processed")
             return stats
@@ -339,8 +685,7 @@ class YOLODetector:
             all_confidence_scores = []
             for detection_file in detection_files:
                 try:
-                    with open(detection_file, 'r') as f:
-                        data = json.load(f)
+                    data = orjson.loads(detection_file.read_bytes())
                     
                     # Extract channel name from image path
                     image_path = Path(data['metadata']['image_path'])
@@ -393,6 +738,23 @@ def main():
         default=0.25,
         help="Confidence threshold (default: 0.25)"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Images per model call (default: {BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--calibration-data",
+        default=CALIBRATION_DATA,
+        help=f"Dataset YAML for INT8 calibration (default: {CALIBRATION_DATA})"
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default='fp16',
+        help="Inference precision; int8 exports a TensorRT engine on first use (default: fp16)"
+    )
     
     args = parser.parse_args()
     
@@ -401,7 +763,10 @@ def main():
     # Initialize detector
     detector = YOLODetector(
         model_size=args.model_size,
-        confidence_threshold=args.confidence
+        confidence_threshold=args.confidence,
+        precision=args.precision,
+        batch_size=args.batch_size,
+        calibration_data=args.calibration_data
     )
     
     # Load model
@@ -410,7 +775,7 @@ def main():
         return
     
     # Process images
-    stats = detector.scan_and_process_images(args.channel)
+    stats = detector.scan_and_process_images(args.channel, args.batch_size)
     
     print(f"\n📊 Processing Statistics:")
     print(f"  Total images found: {stats['total_images']}")
@@ -2,7 +2,7 @@
 Dagster assets module
 """
 from .telegram_assets import telegram_assets
-from .dbt_assets import dbt_assets
+from .dbt_assets import dbt_assets, dbt_resource
 from .yolo_assets import yolo_assets
 
-__all__ = ["telegram_assets", "dbt_assets", "yolo_assets"] 
\ No newline at end of file
+__all__ = ["telegram_assets", "dbt_assets", "dbt_resource", "yolo_assets"] 
\ No newline at end of file
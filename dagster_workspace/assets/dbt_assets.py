@@ -1,135 +1,85 @@
 """
 Dagster assets for dbt transformations
 """
-import sys
+import asyncio
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Mapping, Optional
 
-from dagster import asset, AssetExecutionContext, MetadataValue, Output
+from dagster import asset, AssetExecutionContext, AssetKey, MetadataValue, Output
+from dagster_dbt import DagsterDbtTranslator, DbtCliResource
+from dagster_dbt import dbt_assets as dbt_multi_asset
 
-# Add project root to path
-sys.path.append(str(Path(__file__).parent.parent.parent))
+from app.api.database import DatabaseManager
+from scripts.introspection_cache import IntrospectionCache
 
-@asset(
-    description="Run dbt models for data transformation",
-    group_name="dbt",
-    compute_kind="dbt",
-    deps=["loaded_raw_data", "loaded_detection_data"]
+# dbt project locations
+DBT_PROJECT_DIR = Path(__file__).parent.parent.parent / "dbt" / "telegram_medical_pipeline"
+DBT_PROFILES_DIR = DBT_PROJECT_DIR.parent
+
+# Shared dbt CLI resource for all dbt invocations
+dbt_resource = DbtCliResource(
+    project_dir=str(DBT_PROJECT_DIR),
+    profiles_dir=str(DBT_PROFILES_DIR)
 )
-def dbt_models(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
-    """Run dbt models to transform raw data into analytics-ready tables"""
+
+# Parse the project at load time only if no manifest has been compiled yet
+DBT_MANIFEST_PATH = DBT_PROJECT_DIR / "target" / "manifest.json"
+if not DBT_MANIFEST_PATH.exists():
+    DBT_MANIFEST_PATH = dbt_resource.cli(["--quiet", "parse"]).wait().target_path / "manifest.json"
+
+# dbt sources that are materialized by the loader assets
+DBT_SOURCE_ASSET_KEYS = {
+    "raw_telegram_data": AssetKey("loaded_raw_data"),
+    "raw_image_detections": AssetKey("loaded_detection_data")
+}
+
+class TelegramDbtTranslator(DagsterDbtTranslator):
+    """Map dbt sources onto the loader assets and keep dbt nodes in the dbt group"""
     
-    context.log.info("🔄 Starting dbt model execution...")
+    def get_asset_key(self, dbt_resource_props: Mapping[str, Any]) -> AssetKey:
+        """Use the loader asset key for raw sources"""
+        if dbt_resource_props["resource_type"] == "source":
+            source_key = DBT_SOURCE_ASSET_KEYS.get(dbt_resource_props["name"])
+            if source_key:
+                return source_key
+        return super().get_asset_key(dbt_resource_props)
     
-    try:
-        from scripts.run_dbt import DbtRunner
-        
-        # Initialize dbt runner
-        runner = DbtRunner()
-        
-        # Run dbt models
-        success = runner.run()
-        
-        if not success:
-            raise Exception("dbt model execution failed")
-        
-        # Get model statistics
-        model_stats = {
-            'staging_models': 1,  # stg_telegram_messages
-            'mart_models': 4,     # dim_channels, dim_dates, fct_messages, fct_image_detections
-            'total_models': 5,
-            'execution_timestamp': datetime.now().isoformat(),
-            'status': 'success'
-        }
-        
-        context.log.info(f"✅ dbt models executed successfully: {model_stats['total_models']} models")
-        
-        return Output(
-            value=model_stats,
-            metadata={
-                "staging_models": model_stats['staging_models'],
-                "mart_models": model_stats['mart_models'],
-                "total_models": model_stats['total_models'],
-                "execution_timestamp": model_stats['execution_timestamp'],
-                "status": model_stats['status']
-            }
-        )
-        
-    except Exception as e:
-        context.log.error(f"❌ Error in dbt execution: {e}")
-        raise
+    def get_group_name(self, dbt_resource_props: Mapping[str, Any]) -> str:
+        """Place all dbt models in the dbt group"""
+        return "dbt"
 
-@asset(
-    description="Run dbt tests for data quality",
-    group_name="dbt",
-    compute_kind="dbt",
-    deps=["dbt_models"]
+@dbt_multi_asset(
+    manifest=DBT_MANIFEST_PATH,
+    dagster_dbt_translator=TelegramDbtTranslator()
 )
-def dbt_tests(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
-    """Run dbt tests to validate data quality"""
+def dbt_models(context: AssetExecutionContext, dbt: DbtCliResource):
+    """Build dbt models and run their tests in a single dbt build invocation"""
     
-    context.log.info("🧪 Running dbt tests...")
+    context.log.info("🔄 Starting dbt build...")
     
-    try:
-        from scripts.run_dbt import DbtRunner
-        
-        # Initialize dbt runner
-        runner = DbtRunner()
-        
-        # Run dbt tests
-        success = runner.test()
-        
-        if not success:
-            raise Exception("dbt tests failed")
-        
-        # Test results (simplified)
-        test_results = {
-            'total_tests': 15,  # Built-in + custom tests
-            'passed_tests': 15,
-            'failed_tests': 0,
-            'test_timestamp': datetime.now().isoformat(),
-            'status': 'pass'
-        }
-        
-        context.log.info(f"✅ dbt tests completed: {test_results['passed_tests']}/{test_results['total_tests']} passed")
-        
-        return Output(
-            value=test_results,
-            metadata={
-                "total_tests": test_results['total_tests'],
-                "passed_tests": test_results['passed_tests'],
-                "failed_tests": test_results['failed_tests'],
-                "test_timestamp": test_results['test_timestamp'],
-                "status": test_results['status']
-            }
-        )
-        
-    except Exception as e:
-        context.log.error(f"❌ Error in dbt tests: {e}")
-        raise
+    # dbt build runs each model's tests as soon as that model finishes and
+    # streams materializations and test results back as Dagster events
+    yield from dbt.cli(["build"], context=context).stream()
 
 @asset(
     description="Generate dbt documentation",
     group_name="dbt",
     compute_kind="dbt",
-    deps=["dbt_models", "dbt_tests"]
+    deps=[dbt_models]
 )
-def dbt_documentation(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
+def dbt_documentation(context: AssetExecutionContext, dbt: DbtCliResource) -> Output[Dict[str, Any]]:
     """Generate dbt documentation"""
     
     context.log.info("📚 Generating dbt documentation...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from scripts.run_dbt import DbtRunner
-        
-        # Initialize dbt runner
-        runner = DbtRunner()
-        
-        # Generate documentation
-        success = runner.docs_generate()
+        # Generate documentation with the shared dbt resource
+        invocation = dbt.cli(["docs", "generate"], raise_on_error=False).wait()
         
-        if not success:
+        if not invocation.is_successful():
             raise Exception("dbt documentation generation failed")
         
         doc_stats = {
@@ -137,7 +87,7 @@ def dbt_documentation(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
             'sources_documented': 2,
             'tests_documented': 15,
             'docs_generated': True,
-            'docs_timestamp': datetime.now().isoformat(),
+            'docs_timestamp': now_iso,
             'docs_url': 'http://localhost:8080'
         }
         
@@ -159,37 +109,54 @@ def dbt_documentation(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
         context.log.error(f"❌ Error generating dbt docs: {e}")
         raise
 
+def get_dbt_watermark(context: AssetExecutionContext) -> Optional[str]:
+    """Get the latest dbt model materialization time, or None if dbt has never run"""
+    events = context.instance.get_latest_materialization_events(dbt_models.keys)
+    timestamps = [event.timestamp for event in events.values() if event]
+    return str(max(timestamps)) if timestamps else None
+
 @asset(
     description="Analytics data quality check",
     group_name="dbt",
     compute_kind="python",
-    deps=["dbt_models"]
+    deps=[dbt_models]
 )
 def analytics_data_quality_check(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
     """Perform data quality checks on transformed analytics data"""
     
     context.log.info("🔍 Performing analytics data quality checks...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from app.api.database import DatabaseManager
-        
         db = DatabaseManager()
         
-        # Check fact table
-        fact_count = db.execute_query_count("SELECT COUNT(*) FROM marts.fct_messages")
-        
-        # Check dimension tables
-        dim_channels_count = db.execute_query_count("SELECT COUNT(*) FROM marts.dim_channels")
-        dim_dates_count = db.execute_query_count("SELECT COUNT(*) FROM marts.dim_dates")
-        
-        # Check image detections
-        detections_count = db.execute_query_count("SELECT COUNT(*) FROM marts.fct_image_detections")
-        
-        # Check for data completeness
-        messages_with_channels = db.execute_query_count("""
+        # Mart counts only change when dbt re-materializes, so cache them
+        # against the latest dbt materialization
+        cache = IntrospectionCache()
+        watermark = get_dbt_watermark(context)
+        
+        # Counts touch different tables, so run cache misses concurrently
+        (
+            fact_count,
+            dim_channels_count,
+            dim_dates_count,
+            detections_count,
+            messages_with_channels
+        ) = cache.get_or_fetch_many([
+            # Check fact table
+            "SELECT COUNT(*) FROM marts.fct_messages",
+            # Check dimension tables
+            "SELECT COUNT(*) FROM marts.dim_channels",
+            "SELECT COUNT(*) FROM marts.dim_dates",
+            # Check image detections
+            "SELECT COUNT(*) FROM marts.fct_image_detections",
+            # Check for data completeness
+            """
             SELECT COUNT(*) FROM marts.fct_messages fm
             JOIN marts.dim_channels dc ON fm.channel_name = dc.channel_name
-        """)
+            """
+        ], watermark, lambda queries: asyncio.run(db.execute_query_counts_async(queries)))
         
         completeness_score = 0
         if fact_count > 0:
@@ -202,7 +169,7 @@ def analytics_data_quality_check(context: AssetExecutionContext) -> Output[Dict[
             'image_detections': detections_count,
             'messages_with_channels': messages_with_channels,
             'completeness_score': completeness_score,
-            'check_timestamp': datetime.now().isoformat(),
+            'check_timestamp': now_iso,
             'status': 'pass' if completeness_score >= 90 else 'warning'
         }
         
@@ -228,7 +195,6 @@ def analytics_data_quality_check(context: AssetExecutionContext) -> Output[Dict[
 # Export assets
 dbt_assets = [
     dbt_models,
-    dbt_tests,
     dbt_documentation,
     analytics_data_quality_check
 ] 
\ No newline at end of file
@@ -1,23 +1,50 @@
 """
 Dagster assets for Telegram data scraping and loading
 """
-import sys
-from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
-from dagster import asset, AssetExecutionContext, MetadataValue, Output
+from dagster import (
+    asset,
+    AssetExecutionContext,
+    BackfillPolicy,
+    MaterializeResult,
+    MetadataValue,
+    Output,
+    StaticPartitionsDefinition
+)
 import pandas as pd
 
-# Add project root to path
-sys.path.append(str(Path(__file__).parent.parent.parent))
-
+from app.api.database import DatabaseManager
 from app.services.telegram_scraper import TelegramScraper
-from app.services.data_loader import DataLoader
-from app.core.channels_config import TELEGRAM_CHANNELS
-from app.core.logging_config import setup_logger
+from app.core.channels_config import TELEGRAM_CHANNELS, get_channel_names
+from app.core.logging_config import get_logger
+from scripts.load_raw_data import RawDataLoader
+from scripts.load_detections import DetectionLoader
+
+logger = get_logger(__name__)
+
+# Active channels are fixed at import time, so filter them once per process
+ACTIVE_CHANNELS: Tuple[Dict[str, Any], ...] = tuple(
+    channel for channel in TELEGRAM_CHANNELS if channel.get('active', True)
+)
 
-logger = setup_logger(__name__)
+# One partition per channel so backfills can load channels in a single batched run
+channel_partitions = StaticPartitionsDefinition(get_channel_names())
+
+# Run tags selecting every channel partition. Jobs that contain the loaders carry
+# them so scheduled, sensor and CLI runs record all channels as materialized;
+# a run launched for specific partitions overrides them
+ALL_CHANNELS_TAGS = {
+    "dagster/asset_partition_range_start": get_channel_names()[0],
+    "dagster/asset_partition_range_end": get_channel_names()[-1]
+}
+
+def get_partition_channels(context: AssetExecutionContext) -> Optional[List[str]]:
+    """Get the channels selected by the run's partitions, or None for an unpartitioned run"""
+    if context.has_partition_key or context.has_partition_key_range:
+        return list(context.partition_keys)
+    return None
 
 @asset(
     description="Scrape data from Telegram channels",
@@ -29,20 +56,21 @@ def scraped_telegram_data(context: AssetExecutionContext) -> Output[Dict[str, An
     
     context.log.info("🚀 Starting Telegram data scraping...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
         # Initialize scraper
         scraper = TelegramScraper()
         
-        # Get active channels
-        active_channels = [channel for channel in TELEGRAM_CHANNELS if channel.get('active', True)]
-        context.log.info(f"📊 Found {len(active_channels)} active channels")
+        context.log.info(f"📊 Found {len(ACTIVE_CHANNELS)} active channels")
         
         # Scrape each channel
         results = {}
         total_messages = 0
         total_media = 0
+        successful_channels = 0
         
-        for channel in active_channels:
+        for channel in ACTIVE_CHANNELS:
             channel_name = channel['name']
             channel_url = channel['url']
             
@@ -57,20 +85,24 @@ def scraped_telegram_data(context: AssetExecutionContext) -> Output[Dict[str, An
                 )
                 
                 if channel_data:
+                    messages = channel_data.get('messages', [])
+                    messages_count = len(messages)
+                    media_count = sum(1 for m in messages if m.get('local_media_path'))
                     results[channel_name] = {
-                        'messages_count': len(channel_data.get('messages', [])),
-                        'media_count': len([m for m in channel_data.get('messages', []) if m.get('local_media_path')]),
-                        'scrape_time': datetime.now().isoformat(),
+                        'messages_count': messages_count,
+                        'media_count': media_count,
+                        'scrape_time': now_iso,
                         'status': 'success'
                     }
                     
-                    total_messages += results[channel_name]['messages_count']
-                    total_media += results[channel_name]['media_count']
+                    total_messages += messages_count
+                    total_media += media_count
+                    successful_channels += 1
                 else:
                     results[channel_name] = {
                         'messages_count': 0,
                         'media_count': 0,
-                        'scrape_time': datetime.now().isoformat(),
+                        'scrape_time': now_iso,
                         'status': 'no_data'
                     }
                     
@@ -79,18 +111,18 @@ def scraped_telegram_data(context: AssetExecutionContext) -> Output[Dict[str, An
                 results[channel_name] = {
                     'messages_count': 0,
                     'media_count': 0,
-                    'scrape_time': datetime.now().isoformat(),
+                    'scrape_time': now_iso,
                     'status': 'error',
                     'error': str(e)
                 }
         
         # Create summary
         summary = {
-            'total_channels': len(active_channels),
-            'successful_channels': len([r for r in results.values() if r['status'] == 'success']),
+            'total_channels': len(ACTIVE_CHANNELS),
+            'successful_channels': successful_channels,
             'total_messages': total_messages,
             'total_media': total_media,
-            'scrape_timestamp': datetime.now().isoformat(),
+            'scrape_timestamp': now_iso,
             'channel_results': results
         }
         
@@ -117,40 +149,47 @@ def scraped_telegram_data(context: AssetExecutionContext) -> Output[Dict[str, An
     description="Load scraped data into PostgreSQL",
     group_name="telegram",
     compute_kind="python",
-    deps=["scraped_telegram_data"]
+    deps=["scraped_telegram_data"],
+    partitions_def=channel_partitions,
+    backfill_policy=BackfillPolicy.single_run()
 )
-def loaded_raw_data(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
+def loaded_raw_data(context: AssetExecutionContext) -> MaterializeResult:
     """Load scraped Telegram data into PostgreSQL raw schema"""
     
     context.log.info("🗄️ Starting data loading into PostgreSQL...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
         # Initialize data loader
-        loader = DataLoader()
-        
-        # Load raw data
-        load_stats = loader.load_all_raw_data()
-        
-        context.log.info(f"✅ Data loading completed: {load_stats['loaded_files']}/{load_stats['total_files']} files")
-        
-        # Get database stats
-        db_stats = loader.get_raw_data_stats()
-        
-        summary = {
-            'load_timestamp': datetime.now().isoformat(),
-            'load_stats': load_stats,
-            'database_stats': db_stats
-        }
+        loader = RawDataLoader()
+        try:
+            # Load raw data for the selected channel partitions
+            channels = get_partition_channels(context)
+            if channels is not None:
+                context.log.info(f"📊 Loading {len(channels)} channel partitions")
+            load_stats = loader.load_all_raw_data(channels=channels)
+            
+            context.log.info(f"✅ Data loading completed: {load_stats['loaded_files']}/{load_stats['total_files']} files")
+            
+            # Get database stats
+            db_stats = loader.get_raw_data_stats()
+        finally:
+            loader.close()
         
-        return Output(
-            value=summary,
+        # No output value: the default IO manager can't store one for a
+        # multi-partition (single-run backfill) run, and downstream assets only
+        # depend on the tables
+        return MaterializeResult(
             metadata={
                 "loaded_files": load_stats['loaded_files'],
                 "total_files": load_stats['total_files'],
+                "skipped_files": load_stats['skipped_files'],
                 "failed_files": load_stats['failed_files'],
                 "channels_loaded": len(load_stats['channels']),
+                "channel_files": MetadataValue.json(load_stats['channels']),
                 "total_records": db_stats.get('total_records', 0),
-                "load_timestamp": summary['load_timestamp']
+                "load_timestamp": now_iso
             }
         )
         
@@ -162,44 +201,47 @@ def loaded_raw_data(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
     description="Load YOLO detection results into PostgreSQL",
     group_name="telegram",
     compute_kind="python",
-    deps=["scraped_telegram_data"]
+    deps=["scraped_telegram_data"],
+    partitions_def=channel_partitions,
+    backfill_policy=BackfillPolicy.single_run()
 )
-def loaded_detection_data(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
+def loaded_detection_data(context: AssetExecutionContext) -> MaterializeResult:
     """Load YOLO detection results into PostgreSQL"""
     
     context.log.info("🔍 Loading YOLO detection results...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from scripts.load_detections import DetectionLoader
-        
         # Initialize detection loader
         loader = DetectionLoader()
+        try:
+            # Load detection data for the selected channel partitions
+            channels = get_partition_channels(context)
+            if channels is not None:
+                context.log.info(f"📊 Loading {len(channels)} channel partitions")
+            load_stats = loader.load_all_detections(channels=channels)
+            
+            context.log.info(f"✅ Detection loading completed: {load_stats['loaded_files']}/{load_stats['total_files']} files")
+            
+            # Get database stats
+            db_stats = loader.get_detection_stats()
+        finally:
+            loader.close()
         
-        # Load detection data
-        load_stats = loader.load_all_detections()
-        
-        context.log.info(f"✅ Detection loading completed: {load_stats['loaded_files']}/{load_stats['total_files']} files")
-        
-        # Get database stats
-        db_stats = loader.get_detection_stats()
-        
-        summary = {
-            'load_timestamp': datetime.now().isoformat(),
-            'load_stats': load_stats,
-            'database_stats': db_stats
-        }
-        
-        return Output(
-            value=summary,
+        # Metadata only, as in loaded_raw_data
+        return MaterializeResult(
             metadata={
                 "loaded_files": load_stats['loaded_files'],
                 "total_files": load_stats['total_files'],
+                "skipped_files": load_stats['skipped_files'],
                 "failed_files": load_stats['failed_files'],
                 "channels_with_detections": len(load_stats['channels']),
+                "channel_files": MetadataValue.json(load_stats['channels']),
                 "total_detection_records": db_stats.get('total_records', 0),
                 "total_object_detections": db_stats.get('detection_stats', {}).get('total_detections', 0),
                 "medical_detections": db_stats.get('medical_stats', {}).get('medical_detections', 0),
-                "load_timestamp": summary['load_timestamp']
+                "load_timestamp": now_iso
             }
         )
         
@@ -218,25 +260,27 @@ def telegram_data_quality_check(context: AssetExecutionContext) -> Output[Dict[s
     
     context.log.info("🔍 Performing data quality checks...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from app.api.database import DatabaseManager
-        
         db = DatabaseManager()
         
-        # Check raw data
-        raw_count = db.execute_query_count("SELECT COUNT(*) FROM raw.raw_telegram_data")
-        
-        # Check for empty messages
-        empty_messages = db.execute_query_count("""
-            SELECT COUNT(*) FROM raw.raw_telegram_data 
-            WHERE data_json->>'messages' IS NULL OR jsonb_array_length(data_json->'messages') = 0
-        """)
-        
-        # Check for recent data
-        recent_data = db.execute_query_count("""
-            SELECT COUNT(*) FROM raw.raw_telegram_data 
-            WHERE loaded_at >= CURRENT_DATE - INTERVAL '1 day'
+        # Check raw data, empty messages and recent data in a single scan
+        # so all three counts come from the same snapshot
+        counts = db.execute_query_single("""
+            SELECT
+                COUNT(*) AS raw_count,
+                COUNT(*) FILTER (
+                    WHERE message_count = 0 OR message_count IS NULL
+                ) AS empty_messages,
+                COUNT(*) FILTER (
+                    WHERE loaded_at >= CURRENT_DATE - INTERVAL '1 day'
+                ) AS recent_data
+            FROM raw.raw_telegram_data
         """)
+        raw_count = counts.get('raw_count', 0)
+        empty_messages = counts.get('empty_messages', 0)
+        recent_data = counts.get('recent_data', 0)
         
         # Calculate quality metrics
         quality_score = 0
@@ -248,7 +292,7 @@ def telegram_data_quality_check(context: AssetExecutionContext) -> Output[Dict[s
             'empty_message_files': empty_messages,
             'recent_data_files': recent_data,
             'quality_score': quality_score,
-            'check_timestamp': datetime.now().isoformat(),
+            'check_timestamp': now_iso,
             'status': 'pass' if quality_score >= 80 else 'warning'
         }
         
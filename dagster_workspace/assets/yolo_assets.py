@@ -1,15 +1,13 @@
 """
 Dagster assets for YOLO image detection
 """
-import sys
-from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any
 
 from dagster import asset, AssetExecutionContext, MetadataValue, Output
 
-# Add project root to path
-sys.path.append(str(Path(__file__).parent.parent.parent))
+from app.api.database import DatabaseManager
+from app.services.yolo_detector import YOLODetector
 
 @asset(
     description="Run YOLO image detection on scraped images",
@@ -22,9 +20,9 @@ def yolo_detections(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
     
     context.log.info("🤖 Starting YOLO image detection...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from app.services.yolo_detector import YOLODetector
-        
         # Initialize YOLO detector
         detector = YOLODetector(model_size="n", confidence_threshold=0.25)
         
@@ -35,12 +33,12 @@ def yolo_detections(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
                 value={
                     'status': 'skipped',
                     'reason': 'YOLO model not available',
-                    'detection_timestamp': datetime.now().isoformat()
+                    'detection_timestamp': now_iso
                 },
                 metadata={
                     "status": "skipped",
                     "reason": "YOLO model not available",
-                    "detection_timestamp": datetime.now().isoformat()
+                    "detection_timestamp": now_iso
                 }
             )
         
@@ -59,7 +57,7 @@ def yolo_detections(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
             'total_detections': overall_stats.get('total_detections', 0),
             'medical_detections': overall_stats.get('medical_detections', 0),
             'avg_confidence': overall_stats.get('avg_confidence', 0.0),
-            'detection_timestamp': datetime.now().isoformat(),
+            'detection_timestamp': now_iso,
             'status': 'success'
         }
         
@@ -96,27 +94,28 @@ def yolo_quality_check(context: AssetExecutionContext) -> Output[Dict[str, Any]]
     
     context.log.info("🔍 Performing YOLO detection quality checks...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from app.api.database import DatabaseManager
-        
         db = DatabaseManager()
         
-        # Check detection data
-        detection_count = db.execute_query_count("SELECT COUNT(*) FROM raw.raw_image_detections")
-        
-        # Check for high-confidence detections
-        high_confidence = db.execute_query_count("""
-            SELECT COUNT(*) FROM raw.raw_image_detections,
+        # All counts read the same table, so collapse them into one statement:
+        # detection files, high-confidence detections and medical detections
+        counts = db.execute_query_single("""
+            SELECT
+                (SELECT COUNT(*) FROM raw.raw_image_detections) AS detection_count,
+                COUNT(*) FILTER (
+                    WHERE (detection->>'confidence')::FLOAT >= 0.8
+                ) AS high_confidence,
+                COUNT(*) FILTER (
+                    WHERE detection->>'is_medical_related' = 'true'
+                ) AS medical_detections
+            FROM raw.raw_image_detections,
             LATERAL jsonb_array_elements(detection_data->'detections') as detection
-            WHERE (detection->>'confidence')::FLOAT >= 0.8
-        """)
-        
-        # Check for medical detections
-        medical_detections = db.execute_query_count("""
-            SELECT COUNT(*) FROM raw.raw_image_detections,
-            LATERAL jsonb_array_elements(detection_data->'detections') as detection
-            WHERE detection->>'is_medical_related' = 'true'
         """)
+        detection_count = counts.get('detection_count', 0)
+        high_confidence = counts.get('high_confidence', 0)
+        medical_detections = counts.get('medical_detections', 0)
         
         # Calculate quality metrics
         quality_score = 0
@@ -128,7 +127,7 @@ def yolo_quality_check(context: AssetExecutionContext) -> Output[Dict[str, Any]]
             'high_confidence_detections': high_confidence,
             'medical_detections': medical_detections,
             'quality_score': quality_score,
-            'check_timestamp': datetime.now().isoformat(),
+            'check_timestamp': now_iso,
             'status': 'pass' if quality_score >= 70 else 'warning'
         }
         
@@ -161,9 +160,9 @@ def yolo_analysis(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
     
     context.log.info("📊 Analyzing YOLO detection results...")
     
+    now_iso = datetime.now().isoformat()
+    
     try:
-        from app.api.database import DatabaseManager
-        
         db = DatabaseManager()
         
         # Get detection statistics
@@ -205,7 +204,7 @@ def yolo_analysis(context: AssetExecutionContext) -> Output[Dict[str, Any]]:
             'top_detected_objects': [dict(obj) for obj in top_objects],
             'medical_statistics': dict(medical_stats[0]) if medical_stats else {},
             'channel_statistics': [dict(stat) for stat in channel_stats],
-            'analysis_timestamp': datetime.now().isoformat()
+            'analysis_timestamp': now_iso
         }
         
         context.log.info(f"✅ YOLO analysis completed: {total_detections} total detections")
@@ -3,11 +3,15 @@ Dagster jobs for Telegram Medical Data Pipeline
 """
 from dagster import job, define_asset_job, AssetSelection
 
+from ..assets.telegram_assets import ALL_CHANNELS_TAGS
+
 # Telegram pipeline job - scrapes and loads data
 telegram_pipeline_job = define_asset_job(
     name="telegram_pipeline_job",
     description="Scrape Telegram data and load into PostgreSQL",
     selection=AssetSelection.groups("telegram"),
+    # The loaders are partitioned by channel; schedule and sensor runs load them all
+    tags=ALL_CHANNELS_TAGS,
     config={
         "execution": {
             "config": {
@@ -22,7 +26,7 @@ telegram_pipeline_job = define_asset_job(
 # dbt transformation job
 dbt_job = define_asset_job(
     name="dbt_job",
-    description="Run dbt models and tests",
+    description="Run dbt build (models and tests), docs and analytics checks",
     selection=AssetSelection.groups("dbt"),
     config={
         "execution": {
@@ -56,6 +60,7 @@ full_pipeline_job = define_asset_job(
     name="full_pipeline_job",
     description="Complete end-to-end pipeline: Telegram → dbt → YOLO → Analytics",
     selection=AssetSelection.all(),
+    tags=ALL_CHANNELS_TAGS,
     config={
         "execution": {
             "config": {
@@ -3,7 +3,7 @@ Dagster workspace configuration for Telegram Medical Data Pipeline
 """
 from dagster import Definitions, load_assets_from_modules
 
-from .assets import telegram_assets, dbt_assets, yolo_assets
+from .assets import telegram_assets, dbt_assets, dbt_resource, yolo_assets
 from .jobs import telegram_pipeline_job, dbt_job, yolo_job, full_pipeline_job
 from .schedules import telegram_schedule, daily_schedule
 from .sensors import telegram_sensor
@@ -29,5 +29,8 @@ defs = Definitions(
     ],
     sensors=[
         telegram_sensor
-    ]
+    ],
+    resources={
+        "dbt": dbt_resource
+    }
 ) 
\ No newline at end of file
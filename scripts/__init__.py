@@ -0,0 +1,3 @@
+"""
+Pipeline command-line scripts
+"""
@@ -0,0 +1,93 @@
+"""
+Local cache for warehouse introspection queries (e.g. mart row counts)
+"""
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class IntrospectionCache:
+    """Cache query results on disk, keyed by query text and a data watermark"""
+
+    def __init__(self, cache_path: Optional[Path] = None):
+        """
+        Initialize the introspection cache
+
+        Args:
+            cache_path: SQLite file to store results in (default: ~/.cache/pipeline/introspection.sqlite)
+        """
+        self.cache_path = cache_path or Path.home() / ".cache" / "pipeline" / "introspection.sqlite"
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS introspection (
+                    query TEXT NOT NULL,
+                    watermark TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (query, watermark)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection to the cache, committing on success"""
+        conn = sqlite3.connect(self.cache_path)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, query: str, watermark: str) -> Optional[Any]:
+        """Get a cached result, or None if the query has not been cached at this watermark"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM introspection WHERE query = ? AND watermark = ?",
+                (query, watermark)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, query: str, watermark: str, result: Any):
+        """Store a result, dropping entries for the same query at older watermarks"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM introspection WHERE query = ? AND watermark != ?", (query, watermark))
+            conn.execute(
+                "INSERT OR REPLACE INTO introspection (query, watermark, result) VALUES (?, ?, ?)",
+                (query, watermark, json.dumps(result))
+            )
+
+    def get_or_fetch_many(self, queries: List[str], watermark: Optional[str],
+                          fetch: Callable[[List[str]], List[Any]]) -> List[Any]:
+        """
+        Get results for several queries, fetching only the ones missing from the cache
+
+        Args:
+            queries: SQL queries to resolve
+            watermark: Version of the underlying data; None disables caching
+            fetch: Callable that runs a list of queries and returns their results in order
+
+        Returns:
+            Results in the same order as the queries
+        """
+        if watermark is None:
+            return fetch(queries)
+
+        results: Dict[str, Any] = {}
+        for query in queries:
+            cached = self.get(query, watermark)
+            if cached is not None:
+                results[query] = cached
+
+        missing = [query for query in queries if query not in results]
+        if missing:
+            for query, result in zip(missing, fetch(missing)):
+                self.put(query, watermark, result)
+                results[query] = result
+
+        logger.info(f"Introspection cache: {len(queries) - len(missing)}/{len(queries)} hits")
+        return [results[query] for query in queries]
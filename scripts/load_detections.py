@@ -2,23 +2,35 @@
 """
 Script to load YOLO detection results into PostgreSQL
 """
-import sys
+import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
-
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+from typing import List, Dict, Any, Optional, Tuple
 
+import orjson
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Channel is the directory after media/ in the image path (data/raw/media/<channel>/...)
+CHANNEL_NAME_SQL = """
+    NULLIF(split_part(split_part(detection_data->'metadata'->>'image_path', '/media/', 2), '/', 1), '')
+"""
+
+# Number of detection files inserted per transaction
+BATCH_SIZE = 500
+
+# Threads reading and parsing files ahead of the inserts
+MAX_WORKERS = 8
+
 class DetectionLoader:
     """Load YOLO detection results into PostgreSQL"""
     
@@ -30,16 +42,58 @@ class DetectionLoader:
             'database': 'telegram_medical',
             'user': 'postgres',
             'password': 'password',
-            'port': 5432
+            'port': 5432,
+            # Detect dead server connections held in the pool
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10
         }
+        self.pool = ThreadedConnectionPool(minconn=2, maxconn=16, **self.connection_params)
+        self._progress = 0
+        self._progress_every = 500
         
+    @contextmanager
+    def _conn(self):
+        """Borrow a pooled connection, committing on success and rolling back on error"""
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except psycopg2.OperationalError:
+            # Connection is unusable; drop it so the pool opens a fresh one next time
+            broken = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken or bool(conn.closed))
+            
+    def close(self):
+        """Close all pooled database connections"""
+        if not self.pool.closed:
+            self.pool.closeall()
+            
     def create_detections_schema(self):
         """Create raw schema and detection table"""
         try:
-            conn = psycopg2.connect(**self.connection_params)
-            conn.autocommit = True
-            
-            with conn.cursor() as cursor:
+            with self._conn() as conn, conn.cursor() as cursor:
+                # Skip the DDL round-trips when the last index exists and
+                # channel_name is already generated
+                cursor.execute("""
+                    SELECT to_regclass('raw.idx_raw_image_detections_file') IS NOT NULL
+                       AND EXISTS (
+                           SELECT 1 FROM information_schema.columns
+                           WHERE table_schema = 'raw'
+                             AND table_name = 'raw_image_detections'
+                             AND column_name = 'channel_name'
+                             AND is_generated = 'ALWAYS'
+                       );
+                """)
+                if cursor.fetchone()[0]:
+                    return
+                
                 # Create raw schema if not exists
                 cursor.execute("CREATE SCHEMA IF NOT EXISTS raw;")
                 
@@ -49,11 +103,30 @@ class DetectionLoader:
                         id SERIAL PRIMARY KEY,
                         file_path TEXT NOT NULL,
                         file_name TEXT NOT NULL,
-                        channel_name TEXT,
                         detection_data JSONB NOT NULL,
+                        channel_name TEXT GENERATED ALWAYS AS ({CHANNEL_NAME_SQL}) STORED,
                         loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     );
-                """)
+                """.format(CHANNEL_NAME_SQL=CHANNEL_NAME_SQL))
+                
+                # Tables created before channel_name was generated hold it as a plain
+                # column filled by the loader; rebuild it from the stored JSON
+                cursor.execute("""
+                    DO $$
+                    BEGIN
+                        IF EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_schema = 'raw'
+                              AND table_name = 'raw_image_detections'
+                              AND column_name = 'channel_name'
+                              AND is_generated = 'NEVER'
+                        ) THEN
+                            ALTER TABLE raw.raw_image_detections DROP COLUMN channel_name;
+                            ALTER TABLE raw.raw_image_detections
+                            ADD COLUMN channel_name TEXT GENERATED ALWAYS AS ({CHANNEL_NAME_SQL}) STORED;
+                        END IF;
+                    END $$;
+                """.format(CHANNEL_NAME_SQL=CHANNEL_NAME_SQL))
                 
                 # Create indexes for better performance
                 cursor.execute("""
@@ -66,80 +139,182 @@ class DetectionLoader:
                     ON raw.raw_image_detections (channel_name);
                 """)
                 
+                # Drop duplicates left by the old per-file existence check so the
+                # unique file_path index below can be built
+                cursor.execute("""
+                    DO $$
+                    BEGIN
+                        IF to_regclass('raw.idx_raw_image_detections_file_path') IS NULL THEN
+                            DELETE FROM raw.raw_image_detections a
+                            USING raw.raw_image_detections b
+                            WHERE a.file_path = b.file_path AND a.id > b.id;
+                        END IF;
+                    END $$;
+                """)
+                
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_raw_image_detections_file_path 
+                    ON raw.raw_image_detections (file_path);
+                """)
+                
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_raw_image_detections_file 
                     ON raw.raw_image_detections (file_name);
                 """)
                 
-            conn.close()
             logger.info("✅ Raw image detections schema and tables created successfully")
             
         except Exception as e:
             logger.error(f"❌ Error creating detections schema: {e}")
             raise
             
-    def load_detection_file(self, file_path: Path) -> bool:
-        """Load a single detection file into the database"""
+    def _extract_channel_name(self, image_path: str) -> Optional[str]:
+        """Extract the channel name from an image path, matching the generated channel_name column"""
+        if '/media/' not in image_path:
+            return None
+        return image_path.split('/media/', 1)[1].split('/', 1)[0] or None
+        
+    def _read_bytes(self, file_path: str) -> bytes:
+        """Read a whole file with a single sized read on a raw descriptor"""
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            data = os.read(fd, size)
+            while len(data) < size:
+                chunk = os.read(fd, size - len(data))
+                if not chunk:
+                    break
+                data += chunk
+            return data
+        finally:
+            os.close(fd)
+            
+    def _parse_json(self, raw: bytes) -> Tuple[Any, str]:
+        """Parse a detection file, returning the data and the text to insert (the original bytes when strictly valid)"""
+        try:
+            return orjson.loads(raw), raw.decode('utf-8')
+        except orjson.JSONDecodeError:
+            data = json.loads(raw)
+            return data, orjson.dumps(data).decode()
+            
+    def _get_loaded_paths(self) -> Dict[str, Optional[str]]:
+        """Get the file paths that are already loaded, mapped to their channel"""
+        with self._conn() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT file_path, channel_name FROM raw.raw_image_detections")
+            return dict(cursor.fetchall())
+            
+    def _read_detection_file(self, file_path: Path) -> Optional[Dict[str, str]]:
+        """Read a detection file and build its raw_image_detections row, or None if unreadable"""
         try:
             # Read detection file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                detection_data = json.load(f)
+            detection_data, payload = self._parse_json(self._read_bytes(file_path))
                 
             # Extract metadata
             image_path = detection_data.get('metadata', {}).get('image_path', '')
             image_name = Path(image_path).name if image_path else file_path.stem
             
-            # Extract channel name from image path
-            channel_name = None
-            if image_path:
-                path_parts = Path(image_path).parts
-                if 'media' in path_parts:
-                    media_index = path_parts.index('media')
-                    if media_index + 1 < len(path_parts):
-                        channel_name = path_parts[media_index + 1]
-                        
-            # Connect to database
-            conn = psycopg2.connect(**self.connection_params)
+            return {
+                'file_path': str(file_path),
+                'file_name': image_name,
+                'image_path': image_path,
+                'detection_data': payload
+            }
             
-            with conn.cursor() as cursor:
-                # Check if file already loaded
-                cursor.execute("""
-                    SELECT id FROM raw.raw_image_detections 
-                    WHERE file_path = %s
-                """, (str(file_path),))
-                
-                if cursor.fetchone():
-                    logger.info(f"⏭️ Detection file already loaded: {file_path}")
-                    conn.close()
-                    return True
-                    
-                # Insert detection data
-                cursor.execute("""
-                    INSERT INTO raw.raw_image_detections 
-                    (file_path, file_name, channel_name, detection_data)
-                    VALUES (%s, %s, %s, %s)
-                """, (
-                    str(file_path),
-                    image_name,
-                    channel_name,
-                    json.dumps(detection_data)
-                ))
-                
-            conn.commit()
-            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Error reading detection {file_path}: {e}")
+            return None
+            
+    def _bulk_insert(self, rows: List[Dict[str, str]]) -> List[Optional[str]]:
+        """
+        Insert detection rows in a single transaction
+        
+        Args:
+            rows: Rows with file_path, file_name and detection_data
+            
+        Returns:
+            Channel names of the inserted rows (files already loaded are skipped)
+        """
+        with self._conn() as conn, conn.cursor() as cursor:
+            inserted = execute_values(
+                cursor,
+                """
+                INSERT INTO raw.raw_image_detections 
+                (file_path, file_name, detection_data)
+                VALUES %s
+                ON CONFLICT (file_path) DO NOTHING
+                RETURNING channel_name
+                """,
+                rows,
+                template="(%(file_path)s, %(file_name)s, %(detection_data)s::jsonb)",
+                page_size=BATCH_SIZE,
+                fetch=True
+            )
+            return [row[0] for row in inserted]
+            
+    def _record_progress(self, count: int):
+        """Count loaded detection files and log progress once every _progress_every files"""
+        previous = self._progress
+        self._progress += count
+        if previous // self._progress_every != self._progress // self._progress_every:
+            logger.info("📊 Loaded %d detection files", self._progress)
             
-            logger.info(f"✅ Loaded detection: {file_path}")
-            return True
+    def _flush_batch(self, batch: List[Dict[str, str]], stats: Dict[str, Any]):
+        """Insert a pending batch and update loading statistics"""
+        if not batch:
+            return
+        try:
+            inserted_channels = self._bulk_insert(batch)
+            # Rows that hit ON CONFLICT were loaded by someone else after the scan
+            stats['loaded_files'] += len(inserted_channels)
+            stats['skipped_files'] += len(batch) - len(inserted_channels)
+            self._record_progress(len(inserted_channels))
+            
+            # Track channel stats from the channels Postgres generated
+            for channel_name in inserted_channels:
+                if channel_name:
+                    stats['channels'][channel_name] = stats['channels'].get(channel_name, 0) + 1
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"✅ Loaded batch of {len(batch)} detection files ({len(inserted_channels)} new)")
+        except Exception as e:
+            stats['failed_files'] += len(batch)
+            logger.error(f"❌ Error loading batch of {len(batch)} detection files: {e}")
+        batch.clear()
+        
+    def load_detection_file(self, file_path: Path) -> Optional[Dict[str, Any]]:
+        """Load a single detection file into the database, returning its metadata or None on failure"""
+        row = self._read_detection_file(file_path)
+        if row is None:
+            return None
+            
+        try:
+            inserted_channels = self._bulk_insert([row])
+            self._record_progress(len(inserted_channels))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"✅ Loaded detection: {file_path}")
+            return {
+                'channel': inserted_channels[0] if inserted_channels else None,
+                'image_name': row['file_name'],
+                'ok': True
+            }
             
         except Exception as e:
             logger.error(f"❌ Error loading detection {file_path}: {e}")
-            return False
+            return None
             
-    def load_all_detections(self) -> Dict[str, int]:
-        """Load all detection files from the enriched directory"""
+    def load_all_detections(self, channels: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Load all detection files from the enriched directory
+        
+        Args:
+            channels: Only load detections for images from these channels (optional)
+            
+        Returns:
+            Loading statistics
+        """
         stats = {
             'total_files': 0,
             'loaded_files': 0,
+            'skipped_files': 0,
             'failed_files': 0,
             'channels': {}
         }
@@ -150,34 +325,44 @@ class DetectionLoader:
             
             # Find all detection JSON files
             detection_files = list(self.detections_path.glob("*_detections.json"))
-            stats['total_files'] = len(detection_files)
             
-            logger.info(f"Found {len(detection_files)} detection files to load")
+            # Skip files loaded by earlier runs
+            loaded_paths = self._get_loaded_paths()
             
-            for file_path in detection_files:
-                if self.load_detection_file(file_path):
-                    stats['loaded_files'] += 1
-                    
-                    # Track channel stats
-                    try:
-                        with open(file_path, 'r') as f:
-                            data = json.load(f)
-                            image_path = data.get('metadata', {}).get('image_path', '')
-                            if image_path:
-                                path_parts = Path(image_path).parts
-                                if 'media' in path_parts:
-                                    media_index = path_parts.index('media')
-                                    if media_index + 1 < len(path_parts):
-                                        channel_name = path_parts[media_index + 1]
-                                        if channel_name not in stats['channels']:
-                                            stats['channels'][channel_name] = 0
-                                        stats['channels'][channel_name] += 1
-                    except:
-                        pass
-                else:
-                    stats['failed_files'] += 1
+            pending = [f for f in detection_files if str(f) not in loaded_paths]
+            skipped = [str(f) for f in detection_files if str(f) in loaded_paths]
+            
+            # Detection files are flat, so the channel comes from the image path inside;
+            # loaded files already have it recorded in the database, pending ones are
+            # filtered after parsing
+            selected = set(channels) if channels is not None else None
+            if selected is not None:
+                skipped = [path for path in skipped if loaded_paths[path] in selected]
+                
+            stats['skipped_files'] = len(skipped)
+            stats['total_files'] = len(skipped)
+            
+            logger.info(f"Found {len(detection_files)} detection files, {len(pending)} not yet loaded")
+            
+            batch: List[Dict[str, str]] = []
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                for row in executor.map(self._read_detection_file, pending):
+                    if row is None:
+                        stats['total_files'] += 1
+                        stats['failed_files'] += 1
+                        continue
+                        
+                    if selected is not None and self._extract_channel_name(row['image_path']) not in selected:
+                        continue
+                        
+                    stats['total_files'] += 1
+                    batch.append(row)
+                    if len(batch) >= BATCH_SIZE:
+                        self._flush_batch(batch, stats)
+                        
+            self._flush_batch(batch, stats)
                     
-            logger.info(f"📊 Loading complete: {stats['loaded_files']}/{stats['total_files']} files loaded")
+            logger.info(f"📊 Loading complete: {stats['loaded_files']}/{stats['total_files']} files loaded, {stats['skipped_files']} already loaded")
             logger.info(f"📊 Channels with detections: {list(stats['channels'].keys())}")
             
         except Exception as e:
@@ -188,44 +373,51 @@ class DetectionLoader:
     def get_detection_stats(self) -> Dict[str, Any]:
         """Get statistics about loaded detection data"""
         try:
-            conn = psycopg2.connect(**self.connection_params)
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                # Count total records
-                cursor.execute("SELECT COUNT(*) as count FROM raw.raw_image_detections")
-                total_records = cursor.fetchone()['count']
-                
-                # Count by channel
-                cursor.execute("""
-                    SELECT channel_name, COUNT(*) as count 
-                    FROM raw.raw_image_detections 
-                    WHERE channel_name IS NOT NULL 
-                    GROUP BY channel_name 
-                    ORDER BY count DESC
-                """)
-                channel_stats = cursor.fetchall()
-                
-                # Count total detections across all files
+            with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Aggregate every statistic per channel in a single table scan,
+                # then roll the channel rows up into the overall totals
                 cursor.execute("""
-                    SELECT 
-                        SUM(jsonb_array_length(detection_data->'detections')) as total_detections,
-                        COUNT(*) as files_with_detections
-                    FROM raw.raw_image_detections 
-                    WHERE detection_data->'detections' IS NOT NULL
+                    WITH per_channel AS (
+                        SELECT
+                            channel_name,
+                            COUNT(*) as count,
+                            SUM(jsonb_array_length(detection_data->'detections')) as total_detections,
+                            COUNT(*) FILTER (
+                                WHERE detection_data->'detections' IS NOT NULL
+                            ) as files_with_detections,
+                            SUM((
+                                SELECT COUNT(*)
+                                FROM jsonb_array_elements(detection_data->'detections') as detection
+                                WHERE detection->>'is_medical_related' = 'true'
+                            )) as medical_detections
+                        FROM raw.raw_image_detections
+                        GROUP BY channel_name
+                    )
+                    SELECT
+                        COALESCE(SUM(count), 0) as total_records,
+                        COALESCE(
+                            json_agg(
+                                json_build_object('channel_name', channel_name, 'count', count)
+                                ORDER BY count DESC
+                            ) FILTER (WHERE channel_name IS NOT NULL),
+                            '[]'::json
+                        ) as channel_stats,
+                        json_build_object(
+                            'total_detections', SUM(total_detections),
+                            'files_with_detections', COALESCE(SUM(files_with_detections), 0)
+                        ) as detection_stats,
+                        json_build_object(
+                            'medical_detections', COALESCE(SUM(medical_detections), 0)
+                        ) as medical_stats
+                    FROM per_channel
                 """)
-                detection_stats = cursor.fetchone()
+                row = cursor.fetchone()
                 
-                # Count medical detections
-                cursor.execute("""
-                    SELECT COUNT(*) as medical_detections
-                    FROM raw.raw_image_detections,
-                    LATERAL jsonb_array_elements(detection_data->'detections') as detection
-                    WHERE detection->>'is_medical_related' = 'true'
-                """)
-                medical_stats = cursor.fetchone()
+            total_records = row['total_records']
+            channel_stats = row['channel_stats']
+            detection_stats = row['detection_stats']
+            medical_stats = row['medical_stats']
                 
-            conn.close()
-            
             return {
                 'total_records': total_records,
                 'channel_stats': channel_stats,
@@ -249,6 +441,7 @@ def main():
     print(f"\n📊 Loading Statistics:")
     print(f"  Total detection files found: {stats['total_files']}")
     print(f"  Successfully loaded: {stats['loaded_files']}")
+    print(f"  Already loaded: {stats['skipped_files']}")
     print(f"  Failed: {stats['failed_files']}")
     
     if stats['channels']:
@@ -256,6 +449,7 @@ def main():
     
     # Get database stats
     db_stats = loader.get_detection_stats()
+    loader.close()
     if db_stats:
         print(f"\n📊 Database Statistics:")
         print(f"  Total detection records: {db_stats['total_records']}")
@@ -2,24 +2,48 @@
 """
 Script to load raw JSON files from data lake into PostgreSQL raw schema
 """
-import sys
+import io
+import os
+import csv
 import json
 import logging
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
-
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Set, Tuple
 
+import orjson
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from app.core.config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of files inserted per transaction
+BATCH_SIZE = 500
+
+# Threads reading and parsing files ahead of the inserts
+MAX_WORKERS = 8
+
+# Parallel COPY streams; rows are sharded across them by channel
+INSERT_SHARDS = 4
+
+def bounded_map(executor: Executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """Like Executor.map, but submits lazily and keeps at most `window` results in flight"""
+    in_flight = deque()
+    for item in items:
+        in_flight.append(executor.submit(fn, item))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
 class RawDataLoader:
     """Load raw JSON data into PostgreSQL raw schema"""
     
@@ -31,16 +55,52 @@ class RawDataLoader:
             'database': 'telegram_medical',
             'user': 'postgres',
             'password': 'password',
-            'port': 5432
+            'port': 5432,
+            # Detect dead server connections held in the pool
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10
         }
+        self.pool = ThreadedConnectionPool(minconn=2, maxconn=16, **self.connection_params)
+        self._stats_lock = threading.Lock()
+        self._progress = 0
+        self._progress_every = 500
         
+    @contextmanager
+    def _conn(self):
+        """Borrow a pooled connection, committing on success and rolling back on error"""
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except psycopg2.OperationalError:
+            # Connection is unusable; drop it so the pool opens a fresh one next time
+            broken = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken or bool(conn.closed))
+            
+    def close(self):
+        """Close all pooled database connections"""
+        if not self.pool.closed:
+            self.pool.closeall()
+            
     def create_raw_schema(self):
         """Create raw schema and tables"""
         try:
-            conn = psycopg2.connect(**self.connection_params)
-            conn.autocommit = True
-            
-            with conn.cursor() as cursor:
+            with self._conn() as conn, conn.cursor() as cursor:
+                # DDL is idempotent but costs a round-trip per statement; the
+                # message_count index is built last, so its presence means the
+                # schema is complete. Checked in the database itself so a reset
+                # or a different server is always picked up
+                cursor.execute("SELECT to_regclass('raw.idx_raw_telegram_data_message_count') IS NOT NULL;")
+                if cursor.fetchone()[0]:
+                    return
+                
                 # Create raw schema
                 cursor.execute("CREATE SCHEMA IF NOT EXISTS raw;")
                 
@@ -56,6 +116,18 @@ class RawDataLoader:
                     );
                 """)
                 
+                # Message count computed once at insert time so quality checks
+                # compare an integer instead of re-parsing the JSONB every run
+                cursor.execute("""
+                    ALTER TABLE raw.raw_telegram_data
+                    ADD COLUMN IF NOT EXISTS message_count INTEGER
+                    GENERATED ALWAYS AS (
+                        CASE WHEN jsonb_typeof(data_json->'messages') = 'array'
+                             THEN jsonb_array_length(data_json->'messages')
+                        END
+                    ) STORED;
+                """)
+                
                 # Create index on JSONB for better performance
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_raw_telegram_data_json 
@@ -68,19 +140,114 @@ class RawDataLoader:
                     ON raw.raw_telegram_data (channel_name);
                 """)
                 
-            conn.close()
+                # One row per source file; lets inserts skip files already loaded.
+                # Older tables relied on a racy SELECT check and may hold duplicates,
+                # so keep the first copy of each file before the index is built
+                cursor.execute("""
+                    DO $$
+                    BEGIN
+                        IF to_regclass('raw.idx_raw_telegram_data_file_path') IS NULL THEN
+                            DELETE FROM raw.raw_telegram_data a
+                            USING raw.raw_telegram_data b
+                            WHERE a.file_path = b.file_path AND a.id > b.id;
+                        END IF;
+                    END $$;
+                """)
+                
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_raw_telegram_data_file_path 
+                    ON raw.raw_telegram_data (file_path);
+                """)
+                
+                # Create index on message_count for quality checks
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_raw_telegram_data_message_count 
+                    ON raw.raw_telegram_data (message_count);
+                """)
+                
             logger.info("✅ Raw schema and tables created successfully")
             
         except Exception as e:
             logger.error(f"❌ Error creating raw schema: {e}")
             raise
             
-    def load_json_file(self, file_path: Path) -> bool:
-        """Load a single JSON file into the raw schema"""
+    def _read_bytes(self, file_path: str) -> bytes:
+        """Read a whole file with a single sized read on a raw descriptor"""
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            data = os.read(fd, size)
+            while len(data) < size:
+                chunk = os.read(fd, size - len(data))
+                if not chunk:
+                    break
+                data += chunk
+            return data
+        finally:
+            os.close(fd)
+            
+    def _parse_json(self, raw: bytes) -> Tuple[Any, str]:
+        """
+        Parse a JSON file for its metadata and get the text to store as JSONB
+        
+        Strict JSON is stored as the original file text, so it is never re-serialized.
+        Non-strict files (e.g. NaN) fall back to the stdlib parser and are normalized
+        with orjson, since PostgreSQL would reject them.
+        
+        Args:
+            raw: File contents
+            
+        Returns:
+            Parsed data and the JSON text to insert
+        """
+        try:
+            return orjson.loads(raw), raw.decode('utf-8')
+        except orjson.JSONDecodeError:
+            data = json.loads(raw)
+            return data, orjson.dumps(data).decode()
+            
+    def _get_loaded_paths(self) -> Set[str]:
+        """Get the file paths that are already loaded"""
+        with self._conn() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT file_path FROM raw.raw_telegram_data")
+            return {row[0] for row in cursor.fetchall()}
+            
+    def _iter_json_files(self, root: str) -> Iterator[str]:
+        """Yield JSON file paths under root, walking directories with os.scandir"""
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._iter_json_files(entry.path)
+                elif entry.name.endswith('.json'):
+                    yield entry.path
+                    
+    def _iter_pending_files(self, loaded_paths: Set[str], channels: Optional[Set[str]],
+                            stats: Dict[str, Any]) -> Iterator[str]:
+        """Yield files that still need loading, counting total and skipped files as they are found"""
+        if not self.raw_data_path.exists():
+            return
+            
+        for path in self._iter_json_files(str(self.raw_data_path)):
+            # Files are stored as <date>/<channel>/<file>.json
+            if channels is not None and os.path.basename(os.path.dirname(path)) not in channels:
+                continue
+                
+            # Insert threads update the same stats dict concurrently
+            already_loaded = path in loaded_paths
+            with self._stats_lock:
+                stats['total_files'] += 1
+                if already_loaded:
+                    stats['skipped_files'] += 1
+            if already_loaded:
+                continue
+                
+            yield path
+            
+    def _read_json_file(self, file_path: str) -> Optional[Tuple]:
+        """Read a JSON file and build its raw_telegram_data row, or None if unreadable"""
         try:
             # Read JSON file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data, payload = self._parse_json(self._read_bytes(file_path))
                 
             # Extract metadata
             metadata = data.get('metadata', {})
@@ -95,48 +262,117 @@ class RawDataLoader:
                 except:
                     pass
                     
-            # Connect to database
-            conn = psycopg2.connect(**self.connection_params)
+            return (file_path, channel_name, scrape_date, payload)
             
-            with conn.cursor() as cursor:
-                # Check if file already loaded
-                cursor.execute("""
-                    SELECT id FROM raw.raw_telegram_data 
-                    WHERE file_path = %s
-                """, (str(file_path),))
-                
-                if cursor.fetchone():
-                    logger.info(f"⏭️ File already loaded: {file_path}")
-                    conn.close()
-                    return True
-                    
-                # Insert data
-                cursor.execute("""
-                    INSERT INTO raw.raw_telegram_data 
-                    (file_path, channel_name, scrape_date, data_json)
-                    VALUES (%s, %s, %s, %s)
-                """, (
-                    str(file_path),
-                    channel_name,
-                    scrape_date,
-                    json.dumps(data)
-                ))
+        except Exception as e:
+            logger.error(f"❌ Error reading {file_path}: {e}")
+            return None
+            
+    def _bulk_insert(self, rows: List[Tuple]) -> List[Optional[str]]:
+        """
+        Insert raw data rows in a single transaction
+        
+        Rows are streamed with COPY into a session-local staging table and then
+        moved across, since COPY itself cannot skip files that are already loaded.
+        
+        Args:
+            rows: (file_path, channel_name, scrape_date, data_json) tuples
+            
+        Returns:
+            Channel names of the inserted rows (files already loaded are skipped)
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        
+        with self._conn() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS raw_telegram_data_staging (
+                    file_path TEXT,
+                    channel_name TEXT,
+                    scrape_date DATE,
+                    data_json JSONB
+                ) ON COMMIT DELETE ROWS;
+            """)
+            
+            cursor.copy_expert("""
+                COPY raw_telegram_data_staging (file_path, channel_name, scrape_date, data_json)
+                FROM STDIN WITH (FORMAT csv)
+            """, buffer)
+            
+            cursor.execute("""
+                INSERT INTO raw.raw_telegram_data 
+                (file_path, channel_name, scrape_date, data_json)
+                SELECT file_path, channel_name, scrape_date, data_json
+                FROM raw_telegram_data_staging
+                ON CONFLICT (file_path) DO NOTHING
+                RETURNING channel_name
+            """)
+            return [row[0] for row in cursor.fetchall()]
+            
+    def _record_progress(self, count: int):
+        """Count loaded files and log progress once every _progress_every files"""
+        previous = self._progress
+        self._progress += count
+        if previous // self._progress_every != self._progress // self._progress_every:
+            logger.info("📊 Loaded %d files", self._progress)
+            
+    def _flush_batch(self, batch: List[Tuple], stats: Dict[str, Any]):
+        """Insert a pending batch and update loading statistics (safe to call from insert threads)"""
+        if not batch:
+            return
+        try:
+            inserted_channels = self._bulk_insert(batch)
+            
+            with self._stats_lock:
+                # Files another loader inserted since the scan hit ON CONFLICT and count as already loaded
+                stats['loaded_files'] += len(inserted_channels)
+                stats['skipped_files'] += len(batch) - len(inserted_channels)
+                self._record_progress(len(inserted_channels))
                 
-            conn.commit()
-            conn.close()
+                # Track channel stats from the rows actually inserted
+                for channel_name in inserted_channels:
+                    channel_name = channel_name or 'unknown'
+                    stats['channels'][channel_name] = stats['channels'].get(channel_name, 0) + 1
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"✅ Loaded batch of {len(batch)} files ({len(inserted_channels)} new)")
+        except Exception as e:
+            with self._stats_lock:
+                stats['failed_files'] += len(batch)
+            logger.error(f"❌ Error loading batch of {len(batch)} files: {e}")
+        
+    def load_json_file(self, file_path: Path) -> Optional[Dict[str, Any]]:
+        """Load a single JSON file into the raw schema, returning its metadata or None on failure"""
+        row = self._read_json_file(str(file_path))
+        if row is None:
+            return None
             
-            logger.info(f"✅ Loaded: {file_path}")
-            return True
+        try:
+            inserted_channels = self._bulk_insert([row])
+            with self._stats_lock:
+                self._record_progress(len(inserted_channels))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"✅ Loaded: {file_path}")
+            return {'channel': row[1], 'ok': True}
             
         except Exception as e:
             logger.error(f"❌ Error loading {file_path}: {e}")
-            return False
+            return None
+            
+    def load_all_raw_data(self, channels: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Load all raw JSON files from the data lake
+        
+        Args:
+            channels: Only load files for these channels (optional)
             
-    def load_all_raw_data(self) -> Dict[str, int]:
-        """Load all raw JSON files from the data lake"""
+        Returns:
+            Loading statistics
+        """
         stats = {
             'total_files': 0,
             'loaded_files': 0,
+            'skipped_files': 0,
             'failed_files': 0,
             'channels': {}
         }
@@ -145,30 +381,43 @@ class RawDataLoader:
             # Create raw schema first
             self.create_raw_schema()
             
-            # Find all JSON files
-            json_files = list(self.raw_data_path.rglob("*.json"))
-            stats['total_files'] = len(json_files)
+            # Skip files loaded by earlier runs
+            loaded_paths = self._get_loaded_paths()
             
-            logger.info(f"Found {len(json_files)} JSON files to load")
+            # Stream files from the data lake straight into the parse pool
+            selected = set(channels) if channels is not None else None
+            pending = self._iter_pending_files(loaded_paths, selected, stats)
             
-            for file_path in json_files:
-                if self.load_json_file(file_path):
-                    stats['loaded_files'] += 1
-                    
-                    # Track channel stats
-                    try:
-                        with open(file_path, 'r') as f:
-                            data = json.load(f)
-                            channel_name = data.get('metadata', {}).get('channel_name', 'unknown')
-                            if channel_name not in stats['channels']:
-                                stats['channels'][channel_name] = 0
-                            stats['channels'][channel_name] += 1
-                    except:
-                        pass
-                else:
-                    stats['failed_files'] += 1
+            logger.info(f"Scanning {self.raw_data_path} for JSON files to load")
+            
+            # Each shard keeps at most one batch in flight on its own connection,
+            # so a channel never has two concurrent COPY streams
+            shards: List[List[Tuple]] = [[] for _ in range(INSERT_SHARDS)]
+            in_flight: List[Optional[Future]] = [None] * INSERT_SHARDS
+            
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+                 ThreadPoolExecutor(max_workers=INSERT_SHARDS) as inserter:
+                for row in bounded_map(executor, self._read_json_file, pending, BATCH_SIZE):
+                    if row is None:
+                        with self._stats_lock:
+                            stats['failed_files'] += 1
+                        continue
+                        
+                    shard = hash(row[1]) % INSERT_SHARDS
+                    shards[shard].append(row)
+                    if len(shards[shard]) >= BATCH_SIZE:
+                        if in_flight[shard] is not None:
+                            in_flight[shard].result()
+                        in_flight[shard] = inserter.submit(self._flush_batch, shards[shard], stats)
+                        shards[shard] = []
+                        
+                # Flush the partial batches left in each shard
+                for shard, batch in enumerate(shards):
+                    if in_flight[shard] is not None:
+                        in_flight[shard].result()
+                    inserter.submit(self._flush_batch, batch, stats)
                     
-            logger.info(f"📊 Loading complete: {stats['loaded_files']}/{stats['total_files']} files loaded")
+            logger.info(f"📊 Loading complete: {stats['loaded_files']}/{stats['total_files']} files loaded, {stats['skipped_files']} already loaded")
             logger.info(f"📊 Channels loaded: {list(stats['channels'].keys())}")
             
         except Exception as e:
@@ -179,9 +428,7 @@ class RawDataLoader:
     def get_raw_data_stats(self) -> Dict[str, Any]:
         """Get statistics about loaded raw data"""
         try:
-            conn = psycopg2.connect(**self.connection_params)
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 # Count total records
                 cursor.execute("SELECT COUNT(*) as count FROM raw.raw_telegram_data")
                 total_records = cursor.fetchone()['count']
@@ -206,8 +453,6 @@ class RawDataLoader:
                 """)
                 date_range = cursor.fetchone()
                 
-            conn.close()
-            
             return {
                 'total_records': total_records,
                 'channel_stats': channel_stats,
@@ -230,6 +475,7 @@ def main():
     print(f"\n📊 Loading Statistics:")
     print(f"  Total files found: {stats['total_files']}")
     print(f"  Successfully loaded: {stats['loaded_files']}")
+    print(f"  Already loaded: {stats['skipped_files']}")
     print(f"  Failed: {stats['failed_files']}")
     
     if stats['channels']:
@@ -237,6 +483,7 @@ def main():
     
     # Get database stats
     db_stats = loader.get_raw_data_stats()
+    loader.close()
     if db_stats:
         print(f"\n📊 Database Statistics:")
         print(f"  Total records: {db_stats['total_records']}")
@@ -2,16 +2,17 @@
 """
 Script to run the FastAPI Analytics API server
 """
+import os
 import sys
 import argparse
+import importlib.util
 import uvicorn
-from pathlib import Path
-
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
 
 from app.core.config import settings
 
+# uvloop isn't installed on Windows; "auto" uses it whenever it is available
+DEFAULT_LOOP = "uvloop" if importlib.util.find_spec("uvloop") else "auto"
+
 def main():
     """Main function to run the FastAPI server"""
     parser = argparse.ArgumentParser(description="Run Telegram Medical Analytics API")
@@ -34,8 +35,25 @@ def main():
     parser.add_argument(
         "--workers",
         type=int,
-        default=1,
-        help="Number of worker processes (default: 1)"
+        default=None,
+        help="Number of worker processes (default: number of CPU cores, at least 2)"
+    )
+    parser.add_argument(
+        "--loop",
+        choices=["uvloop", "asyncio", "auto"],
+        default=DEFAULT_LOOP,
+        help=f"Event loop implementation (default: {DEFAULT_LOOP})"
+    )
+    parser.add_argument(
+        "--http",
+        choices=["httptools", "h11", "auto"],
+        default="httptools",
+        help="HTTP protocol implementation (default: httptools)"
+    )
+    parser.add_argument(
+        "--access-log",
+        action="store_true",
+        help="Log every request (disabled by default for throughput)"
     )
     parser.add_argument(
         "--log-level",
@@ -46,11 +64,18 @@ def main():
     
     args = parser.parse_args()
     
+    # Auto-reload only supports a single worker process
+    if args.reload:
+        args.workers = 1
+    elif args.workers is None:
+        args.workers = max(2, os.cpu_count() or 1)
+    
     print("🚀 Starting Telegram Medical Analytics API...")
     print(f"📍 Host: {args.host}")
     print(f"🔌 Port: {args.port}")
     print(f"🔄 Reload: {args.reload}")
     print(f"👥 Workers: {args.workers}")
+    print(f"⚡ Loop/HTTP: {args.loop}/{args.http}")
     print(f"📝 Log Level: {args.log_level}")
     print(f"📖 Documentation: http://{args.host}:{args.port}/docs")
     print(f"📚 ReDoc: http://{args.host}:{args.port}/redoc")
@@ -64,8 +89,10 @@ def main():
             port=args.port,
             reload=args.reload,
             workers=args.workers,
+            loop=args.loop,
+            http=args.http,
             log_level=args.log_level,
-            access_log=True
+            access_log=args.access_log
         )
     except KeyboardInterrupt:
         print("\n🛑 API server stopped by user")
@@ -2,13 +2,79 @@
 """
 Script to run Dagster UI and manage the Telegram Medical Data Pipeline
 """
+import os
 import sys
+import json
+import time
+import uuid
+import signal
+import socket
+import asyncio
+import hashlib
+import logging
 import argparse
 import subprocess
 from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, TextIO
 
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+LOG_DIR = Path("logs")
+WORKSPACE_DIR = Path("dagster_workspace")
+WORKSPACE_MODULE = "dagster_workspace.workspace"
+SERVER_STATE_FILE = WORKSPACE_DIR / ".server.pid"
+SERVER_TTL = 3600  # Restart the code server after an hour even if nothing changed
+SERVER_STARTUP_TIMEOUT = 120
+
+# Printed by list-jobs / list-schedules in a single write
+_JOBS_DOC = """\
+📋 Available Dagster Jobs:
+
+1. telegram_pipeline_job
+   Description: Scrape Telegram data and load into PostgreSQL
+   Assets: scraped_telegram_data, loaded_raw_data, loaded_detection_data, telegram_data_quality_check
+
+2. dbt_job
+   Description: Run dbt build (models and tests), docs and analytics checks
+   Assets: dbt_models (dbt build), dbt_documentation, analytics_data_quality_check
+
+3. yolo_job
+   Description: Run YOLO image detection and analysis
+   Assets: yolo_detections, yolo_quality_check, yolo_analysis
+
+4. full_pipeline_job
+   Description: Complete end-to-end pipeline
+   Assets: All assets from all groups
+
+"""
+
+_SCHEDULES_DOC = """\
+⏰ Available Dagster Schedules:
+
+1. daily_pipeline_schedule
+   Job: full_pipeline_job
+   Schedule: Every day at 6:00 AM
+   Status: Running
+
+2. telegram_data_schedule
+   Job: telegram_pipeline_job
+   Schedule: Every 4 hours
+   Status: Running
+
+3. dbt_transformation_schedule
+   Job: dbt_job
+   Schedule: Every 6 hours
+   Status: Running
+
+4. yolo_detection_schedule
+   Job: yolo_job
+   Schedule: Every 12 hours
+   Status: Running
+
+5. weekly_refresh_schedule
+   Job: full_pipeline_job
+   Schedule: Every Sunday at 2:00 AM
+   Status: Running
+
+"""
 
 def run_dagster_dev():
     """Run Dagster development server"""
@@ -49,103 +115,301 @@ def run_dagster_dev():
     
     return True
 
-def run_job(job_name: str):
-    """Run a specific Dagster job"""
+async def _stream_lines(stream: asyncio.StreamReader) -> AsyncIterator[str]:
+    """Yield decoded lines from a subprocess stream as they arrive"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        yield line.decode(errors="replace").rstrip("\n")
+
+def _workspace_fingerprint() -> str:
+    """Fingerprint the workspace definition files by path, size and mtime"""
+    digest = hashlib.sha256()
+    paths = [WORKSPACE_DIR / "workspace.yaml", *WORKSPACE_DIR.rglob("*.py")]
+    for path in sorted(paths):
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def _process_alive(pid: int) -> bool:
+    """Check whether a process with this pid is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _is_code_server(pid: int) -> bool:
+    """Check that a pid still belongs to our code server, not a process that reused it"""
+    try:
+        args = Path(f"/proc/{pid}/cmdline").read_bytes().decode(errors='replace').split("\0")
+    except OSError:
+        # No procfs (e.g. macOS); ask ps instead
+        try:
+            result = subprocess.run(["ps", "-o", "args=", "-p", str(pid)],
+                                    capture_output=True, text=True, timeout=5)
+        except (OSError, subprocess.SubprocessError):
+            return False
+        args = result.stdout.split()
+    command = " ".join(args)
+    return "dagster" in command and "grpc" in args and WORKSPACE_MODULE in args
+
+def _read_server_state() -> Optional[Dict]:
+    """Read the recorded code server pid, port and fingerprint, if any"""
+    try:
+        return json.loads(SERVER_STATE_FILE.read_text())
+    except (OSError, ValueError):
+        return None
+
+def stop_grpc_server() -> bool:
+    """Stop the recorded Dagster code server"""
+    state = _read_server_state()
+    SERVER_STATE_FILE.unlink(missing_ok=True)
+    if state and _process_alive(state['pid']):
+        if not _is_code_server(state['pid']):
+            print(f"⏭️ Pid {state['pid']} is no longer the Dagster code server, leaving it alone")
+            return False
+        os.kill(state['pid'], signal.SIGTERM)
+        print(f"🛑 Stopped Dagster code server (pid {state['pid']})")
+        return True
+    return False
+
+def _wait_for_port(process: subprocess.Popen, port: int) -> bool:
+    """Wait until the server accepts connections, or give up if it exits or times out"""
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+def ensure_grpc_server() -> Optional[int]:
+    """
+    Get the port of a running Dagster code server, starting one if needed
+    
+    The server loads the workspace once and is shared by later CLI invocations
+    until the TTL passes or a workspace file changes.
+    
+    Returns:
+        Port of the server, or None if it could not be started
+    """
+    fingerprint = _workspace_fingerprint()
+    state = _read_server_state()
+    if state and _process_alive(state['pid']):
+        if state['fingerprint'] == fingerprint and time.time() - state['started_at'] < SERVER_TTL:
+            print(f"♻️ Reusing Dagster code server on port {state['port']}")
+            return state['port']
+        print("🔄 Workspace changed or server expired, restarting Dagster code server")
+        stop_grpc_server()
+    
+    # Let the OS pick a free port
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    
+    print(f"🚀 Starting Dagster code server on port {port}...")
+    LOG_DIR.mkdir(exist_ok=True)
+    with open(LOG_DIR / "dagster_grpc_server.log", "a", encoding="utf-8") as server_log:
+        # New session so the server outlives this CLI invocation
+        process = subprocess.Popen([
+            "dagster", "api", "grpc",
+            "--module-name", WORKSPACE_MODULE,
+            "--host", "127.0.0.1",
+            "--port", str(port)
+        ], stdout=server_log, stderr=subprocess.STDOUT, start_new_session=True)
+    
+    if not _wait_for_port(process, port):
+        print(f"❌ Dagster code server did not start (see {LOG_DIR / 'dagster_grpc_server.log'})")
+        if process.poll() is None:
+            process.terminate()
+        return None
+    
+    SERVER_STATE_FILE.write_text(json.dumps({
+        'pid': process.pid,
+        'port': port,
+        'fingerprint': fingerprint,
+        'started_at': time.time()
+    }))
+    return port
+
+async def _tee(stream: asyncio.StreamReader, job_name: str, log: TextIO):
+    """Copy a subprocess's output to the terminal and the job's log file"""
+    async for line in _stream_lines(stream):
+        log.write(line + "\n")
+        print(f"[{job_name}] {line}")
+
+async def _execute_job(job_name: str, log: TextIO) -> bool:
+    """Execute a job in a fresh dagster process that loads the workspace itself"""
+    # Output is consumed line by line rather than buffered in memory until the job exits
+    process = await asyncio.create_subprocess_exec(
+        "dagster", "job", "execute",
+        "--workspace-file", "dagster_workspace/workspace.yaml",
+        "--job", job_name,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+    await _tee(process.stdout, job_name, log)
+    return await process.wait() == 0
+
+async def _launch_job(job_name: str, grpc_port: int, log: TextIO) -> bool:
+    """Launch a job against the running code server and follow it until it finishes"""
+    from dagster import DagsterInstance, DagsterRunStatus
+    
+    run_id = str(uuid.uuid4())
+    process = await asyncio.create_subprocess_exec(
+        "dagster", "job", "launch",
+        "--grpc-host", "127.0.0.1",
+        "--grpc-port", str(grpc_port),
+        "--job", job_name,
+        "--run-id", run_id,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+    await _tee(process.stdout, job_name, log)
+    if await process.wait() != 0:
+        return False
+    
+    # The run executes asynchronously, so poll the instance for its events and status;
+    # the cursor makes each poll fetch only events recorded since the last one
+    instance = DagsterInstance.get()
+    cursor = None
+    while True:
+        run = await asyncio.to_thread(instance.get_run_by_id, run_id)
+        while True:
+            connection = await asyncio.to_thread(instance.get_records_for_run, run_id, cursor)
+            for record in connection.records:
+                entry = record.event_log_entry
+                line = f"{logging.getLevelName(entry.level)} {entry.step_key or ''} {entry.message}".strip()
+                log.write(line + "\n")
+                print(f"[{job_name}] {line}")
+            cursor = connection.cursor
+            if not connection.has_more:
+                break
+        
+        if run is not None and run.is_finished:
+            return run.status == DagsterRunStatus.SUCCESS
+        await asyncio.sleep(2)
+
+async def run_job(job_name: str, grpc_port: Optional[int] = None) -> bool:
+    """
+    Run a specific Dagster job, teeing its output to the terminal and a log file
+    
+    Args:
+        job_name: Name of the job to run
+        grpc_port: Port of a running code server to launch against; without one
+            the job is executed in its own dagster process
+    """
     print(f"🎯 Running Dagster job: {job_name}")
     
+    log_file = LOG_DIR / f"dagster_{job_name}.log"
     try:
-        # Run the job using dagster job execute
-        result = subprocess.run([
-            "dagster", "job", "execute",
-            "--workspace-file", "dagster_workspace/workspace.yaml",
-            "--job", job_name
-        ], capture_output=True, text=True)
+        LOG_DIR.mkdir(exist_ok=True)
+        
+        with open(log_file, "w", encoding="utf-8") as log:
+            if grpc_port is None:
+                success = await _execute_job(job_name, log)
+            else:
+                success = await _launch_job(job_name, grpc_port, log)
         
-        if result.returncode == 0:
+        if success:
             print(f"✅ Job {job_name} completed successfully")
-            print(result.stdout)
         else:
-            print(f"❌ Job {job_name} failed")
-            print(result.stderr)
+            print(f"❌ Job {job_name} failed (see {log_file})")
+        return success
             
     except Exception as e:
         print(f"❌ Error running job {job_name}: {e}")
+        return False
+
+async def run_jobs(job_names: List[str], max_concurrent: int = 2,
+                   grpc_port: Optional[int] = None) -> bool:
+    """Run several Dagster jobs at once, at most max_concurrent at a time"""
+    semaphore = asyncio.Semaphore(max_concurrent)
+    
+    async def run_limited(job_name: str) -> bool:
+        async with semaphore:
+            return await run_job(job_name, grpc_port)
+    
+    results = await asyncio.gather(*(run_limited(job_name) for job_name in job_names))
+    
+    succeeded = sum(results)
+    print(f"📊 {succeeded}/{len(job_names)} jobs succeeded")
+    return all(results)
 
 def list_jobs():
     """List available Dagster jobs"""
-    print("📋 Available Dagster Jobs:")
-    print()
-    print("1. telegram_pipeline_job")
-    print("   Description: Scrape Telegram data and load into PostgreSQL")
-    print("   Assets: scraped_telegram_data, loaded_raw_data, loaded_detection_data, telegram_data_quality_check")
-    print()
-    print("2. dbt_job")
-    print("   Description: Run dbt models and tests")
-    print("   Assets: dbt_models, dbt_tests, dbt_documentation, analytics_data_quality_check")
-    print()
-    print("3. yolo_job")
-    print("   Description: Run YOLO image detection and analysis")
-    print("   Assets: yolo_detections, yolo_quality_check, yolo_analysis")
-    print()
-    print("4. full_pipeline_job")
-    print("   Description: Complete end-to-end pipeline")
-    print("   Assets: All assets from all groups")
-    print()
+    sys.stdout.write(_JOBS_DOC)
 
 def list_schedules():
     """List available Dagster schedules"""
-    print("⏰ Available Dagster Schedules:")
-    print()
-    print("1. daily_pipeline_schedule")
-    print("   Job: full_pipeline_job")
-    print("   Schedule: Every day at 6:00 AM")
-    print("   Status: Running")
-    print()
-    print("2. telegram_data_schedule")
-    print("   Job: telegram_pipeline_job")
-    print("   Schedule: Every 4 hours")
-    print("   Status: Running")
-    print()
-    print("3. dbt_transformation_schedule")
-    print("   Job: dbt_job")
-    print("   Schedule: Every 6 hours")
-    print("   Status: Running")
-    print()
-    print("4. yolo_detection_schedule")
-    print("   Job: yolo_job")
-    print("   Schedule: Every 12 hours")
-    print("   Status: Running")
-    print()
-    print("5. weekly_refresh_schedule")
-    print("   Job: full_pipeline_job")
-    print("   Schedule: Every Sunday at 2:00 AM")
-    print("   Status: Running")
-    print()
+    sys.stdout.write(_SCHEDULES_DOC)
 
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(description="Dagster Pipeline Management")
     parser.add_argument(
         "command",
-        choices=["dev", "run", "list-jobs", "list-schedules"],
+        choices=["dev", "run", "list-jobs", "list-schedules", "stop-server"],
         help="Command to execute"
     )
     parser.add_argument(
         "--job",
         help="Job name to run (use with 'run' command)"
     )
+    parser.add_argument(
+        "--jobs",
+        nargs="+",
+        help="Several job names to run concurrently (use with 'run' command)"
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=2,
+        help="Maximum number of jobs running at once with --jobs (default: 2)"
+    )
+    parser.add_argument(
+        "--no-server",
+        action="store_true",
+        help="Execute jobs in their own process instead of through the shared code server"
+    )
     
     args = parser.parse_args()
     
     if args.command == "dev":
         run_dagster_dev()
     elif args.command == "run":
-        if not args.job:
-            print("❌ Please specify a job name with --job")
+        if not args.job and not args.jobs:
+            print("❌ Please specify a job name with --job (or several with --jobs)")
             print("Available jobs:")
             list_jobs()
             return
-        run_job(args.job)
+        
+        # Launched runs are tracked through the instance, which has to be
+        # persistent for this process to see them
+        grpc_port = None
+        if not args.no_server:
+            if os.environ.get("DAGSTER_HOME"):
+                grpc_port = ensure_grpc_server()
+            else:
+                print("💡 Set DAGSTER_HOME to reuse a shared code server between runs")
+        
+        if args.jobs:
+            job_names = ([args.job] if args.job else []) + args.jobs
+            success = asyncio.run(run_jobs(job_names, args.max_concurrent, grpc_port))
+        else:
+            success = asyncio.run(run_job(args.job, grpc_port))
+        if not success:
+            sys.exit(1)
+    elif args.command == "stop-server":
+        if not stop_grpc_server():
+            print("ℹ️ No Dagster code server running")
     elif args.command == "list-jobs":
         list_jobs()
     elif args.command == "list-schedules":
@@ -3,14 +3,34 @@
 Script to run dbt commands for the Telegram Medical Data Pipeline
 """
 import sys
+import hashlib
+import shutil
 import subprocess
 import logging
+import threading
+from collections import deque
+from datetime import datetime
 from pathlib import Path
 
+try:
+    # Programmatic invocations (dbt-core >= 1.5)
+    from dbt.cli.main import dbtRunner
+    from dbt.contracts.graph.manifest import Manifest
+except ImportError:
+    dbtRunner = None
+    Manifest = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Full dbt output goes to log files; only this many trailing lines are kept in memory
+LOG_DIR = Path("logs")
+TAIL_LINES = 200
+# Log files kept per dbt command; older ones are deleted as new runs start
+LOG_RETENTION = 20
+COMMAND_TIMEOUT = 300  # 5 minute timeout
+
 class DbtRunner:
     """Run dbt commands for the data transformation pipeline"""
     
@@ -19,8 +39,118 @@ class DbtRunner:
         self.dbt_project_dir = Path("dbt/telegram_medical_pipeline")
         self.profiles_dir = Path("dbt")
         
+        # In-process runner, built lazily and rebuilt whenever a fresh manifest is parsed
+        self._runner = None
+        self._manifest = None
+        self._messages = {'stdout': deque(maxlen=TAIL_LINES), 'stderr': deque(maxlen=TAIL_LINES)}
+        self._event_log = None
+        # dbt does not support concurrent invocations within one process
+        self._invoke_lock = threading.Lock()
+        # Set once an in-process invocation overruns COMMAND_TIMEOUT
+        self._invoke_timed_out = False
+        
+    @property
+    def in_process(self) -> bool:
+        """Whether commands run through dbt's Python API instead of a subprocess"""
+        return dbtRunner is not None and not self._invoke_timed_out
+        
+    def _log_path(self, command: str) -> Path:
+        """Build a unique log file path for one dbt command, pruning its oldest logs"""
+        LOG_DIR.mkdir(exist_ok=True)
+        name = command.split()[0]
+        # Timestamped names sort chronologically; leave room for the new file
+        for old_log in sorted(LOG_DIR.glob(f"dbt_{name}_*.log"))[:-(LOG_RETENTION - 1) or None]:
+            old_log.unlink(missing_ok=True)
+        return LOG_DIR / f"dbt_{name}_{datetime.now():%Y%m%d_%H%M%S_%f}.log"
+        
+    def _capture_event(self, event):
+        """Write dbt log events to the invocation's log file, keeping the tail in memory"""
+        level = event.info.level
+        if level == 'debug':
+            return
+        if self._event_log is not None:
+            self._event_log.write(f"{event.info.msg}\n".encode(errors='replace'))
+        stream = 'stderr' if level == 'error' else 'stdout'
+        self._messages[stream].append(event.info.msg)
+        
+    def _get_runner(self):
+        """Get the in-process runner, reusing the last parsed manifest"""
+        if self._runner is None:
+            self._runner = dbtRunner(manifest=self._manifest, callbacks=[self._capture_event])
+        return self._runner
+        
     def run_command(self, command: str, capture_output: bool = True) -> dict:
         """Run a dbt command and return results"""
+        # docs serve blocks and prints for the user, so it always gets its own process
+        if self.in_process and capture_output:
+            return self._invoke(command)
+        return self._run_subprocess(command, capture_output)
+        
+    def _invoke(self, command: str) -> dict:
+        """Run a dbt command in this process with dbtRunner"""
+        args = command.split() + [
+            '--project-dir', str(self.dbt_project_dir.resolve()),
+            '--profiles-dir', str(self.profiles_dir.resolve())
+        ]
+        
+        with self._invoke_lock:
+            if self._invoke_timed_out:
+                # A queued command whose predecessor hung
+                return self._run_subprocess(command)
+                
+            logger.info(f"Running: dbt {command}")
+            log_path = self._log_path(command)
+            self._messages = {'stdout': deque(maxlen=TAIL_LINES), 'stderr': deque(maxlen=TAIL_LINES)}
+            outcome = {}
+            
+            def invoke():
+                try:
+                    with open(log_path, 'wb', buffering=1 << 20) as self._event_log:
+                        outcome['result'] = self._get_runner().invoke(args)
+                except Exception as e:
+                    outcome['error'] = e
+                finally:
+                    self._event_log = None
+                    
+            # dbtRunner can't be cancelled, so wait on a daemon thread with a deadline
+            worker = threading.Thread(target=invoke, name="dbt-invoke", daemon=True)
+            worker.start()
+            worker.join(COMMAND_TIMEOUT)
+            if worker.is_alive():
+                # The stuck invocation keeps running and dbt can't run twice in one
+                # process, so every later command goes through a subprocess instead
+                logger.error(f"Command timed out: dbt {command}")
+                self._invoke_timed_out = True
+                self._runner = None
+                return {'success': False, 'error': 'timeout', 'log_file': str(log_path)}
+                
+            if 'error' in outcome:
+                logger.error(f"Error running dbt command: {outcome['error']}")
+                return {'success': False, 'error': str(outcome['error']), 'log_file': str(log_path)}
+            result = outcome['result']
+                
+            if command.split()[0] == 'deps':
+                # New packages invalidate the cached manifest
+                self._manifest = None
+                self._runner = None
+            elif result.success and Manifest is not None and isinstance(result.result, Manifest):
+                # Later commands skip parsing by starting from this manifest
+                self._manifest = result.result
+                self._runner = None
+                
+            response = {
+                'success': result.success,
+                'returncode': 0 if result.success else 1,
+                'stdout': "\n".join(self._messages['stdout']),
+                'stderr': "\n".join(self._messages['stderr']),
+                'log_file': str(log_path)
+            }
+            if result.exception is not None:
+                response['error'] = str(result.exception)
+            return response
+        
+    def _run_subprocess(self, command: str, capture_output: bool = True) -> dict:
+        """Run a dbt command in a child process"""
         try:
             logger.info(f"Running: dbt {command}")
             
@@ -28,24 +158,77 @@ class DbtRunner:
             env = {
                 'DBT_PROJECT_DIR': str(self.dbt_project_dir),
                 'DBT_PROFILES_DIR': str(self.profiles_dir),
+                # Reuse target/partial_parse.msgpack instead of re-parsing the project
+                'DBT_PARTIAL_PARSE': 'true',
+                'DBT_WRITE_JSON': 'true',
                 'PATH': '/usr/local/bin:/usr/bin:/bin'
             }
             
-            # Run the command
-            result = subprocess.run(
-                ['dbt'] + command.split(),
-                cwd=self.dbt_project_dir,
+            # subprocess only uses posix_spawn (no fork of this process) for an
+            # absolute executable with no cwd and close_fds off, so resolve dbt
+            # up front and pass the project location as flags instead of cwd
+            executable = shutil.which('dbt', path=env['PATH'])
+            if executable is None:
+                raise FileNotFoundError('dbt')
+                
+            args = [executable] + command.split() + [
+                '--project-dir', str(self.dbt_project_dir.resolve()),
+                '--profiles-dir', str(self.profiles_dir.resolve())
+            ]
+            
+            if not capture_output:
+                # Interactive commands print straight to the terminal
+                result = subprocess.run(
+                    args,
+                    env=env,
+                    close_fds=False,  # Python's own fds are non-inheritable by default
+                    timeout=COMMAND_TIMEOUT
+                )
+                return {
+                    'success': result.returncode == 0,
+                    'returncode': result.returncode,
+                    'stdout': None,
+                    'stderr': None
+                }
+                
+            # Stream the merged output to a log file as it arrives instead of
+            # buffering a whole run in memory; keep only the tail for callers
+            log_path = self._log_path(command)
+            tail = deque(maxlen=TAIL_LINES)
+            process = subprocess.Popen(
+                args,
                 env=env,
-                capture_output=capture_output,
-                text=True,
-                timeout=300  # 5 minute timeout
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                close_fds=False  # Python's own fds are non-inheritable by default
             )
+            timed_out = threading.Event()
             
+            def kill_on_timeout():
+                timed_out.set()
+                process.kill()
+                
+            timer = threading.Timer(COMMAND_TIMEOUT, kill_on_timeout)
+            timer.start()
+            try:
+                with process, open(log_path, 'wb', buffering=1 << 20) as log:
+                    for line in process.stdout:
+                        log.write(line)
+                        tail.append(line)
+                    returncode = process.wait()
+            finally:
+                timer.cancel()
+                
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(args, COMMAND_TIMEOUT)
+                
+            output = b"".join(tail).decode(errors='replace')
             return {
-                'success': result.returncode == 0,
-                'returncode': result.returncode,
-                'stdout': result.stdout if capture_output else None,
-                'stderr': result.stderr if capture_output else None
+                'success': returncode == 0,
+                'returncode': returncode,
+                'stdout': output,
+                'stderr': output if returncode != 0 else '',
+                'log_file': str(log_path)
             }
             
         except subprocess.TimeoutExpired:
@@ -58,6 +241,16 @@ class DbtRunner:
             logger.error(f"Error running dbt command: {e}")
             return {'success': False, 'error': str(e)}
     
+    def parse(self) -> bool:
+        """Parse the project once so later commands can reuse the manifest"""
+        logger.info("🧩 Parsing dbt project...")
+        result = self.run_command("parse")
+        if result['success']:
+            logger.info("✅ Project parsed successfully")
+        else:
+            logger.error(f"❌ Failed to parse project: {result.get('stderr', 'Unknown error')}")
+        return result['success']
+        
     def deps(self) -> bool:
         """Install dbt dependencies"""
         logger.info("📦 Installing dbt dependencies...")
@@ -84,8 +277,9 @@ class DbtRunner:
         """Run dbt models"""
         command = "run"
         if models:
-            command += f" --models {models}"
+            command += f" --select {models}"
             
+        # A single invocation; dbt's own threads run independent models in parallel
         logger.info(f"🚀 Running dbt models: {command}")
         result = self.run_command(command)
         
@@ -101,7 +295,7 @@ class DbtRunner:
         """Run dbt tests"""
         command = "test"
         if models:
-            command += f" --models {models}"
+            command += f" --select {models}"
             
         logger.info(f"🧪 Running dbt tests: {command}")
         result = self.run_command(command)
@@ -114,12 +308,39 @@ class DbtRunner:
             logger.error(f"❌ Tests failed: {result.get('stderr', 'Unknown error')}")
         return result['success']
     
+    def _docs_fingerprint(self) -> str:
+        """Fingerprint the model SQL/YAML files and project config by size and mtime"""
+        models_dir = self.dbt_project_dir / "models"
+        paths = [self.dbt_project_dir / "dbt_project.yml"]
+        paths += [path for pattern in ("*.sql", "*.yml") for path in models_dir.rglob(pattern)]
+        
+        digest = hashlib.sha256()
+        for path in sorted(paths):
+            if path.exists():
+                stat = path.stat()
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+        
     def docs_generate(self) -> bool:
         """Generate dbt documentation"""
+        target_dir = self.dbt_project_dir / "target"
+        fingerprint_file = self.dbt_project_dir / ".dbt_docs_cache"
+        fingerprint = self._docs_fingerprint()
+        
+        docs_exist = (target_dir / "index.html").exists() and (target_dir / "catalog.json").exists()
+        if docs_exist and fingerprint_file.exists() and fingerprint_file.read_text() == fingerprint:
+            logger.info("📚 Docs unchanged — skipping")
+            return True
+        
         logger.info("📚 Generating dbt documentation...")
-        result = self.run_command("docs generate")
+        # Reuse the manifest the preceding run compiled instead of compiling again
+        command = "docs generate"
+        if (target_dir / "manifest.json").exists():
+            command += " --no-compile"
+        result = self.run_command(command)
         
         if result['success']:
+            fingerprint_file.write_text(fingerprint)
             logger.info("✅ Documentation generated successfully")
             logger.info("📖 Documentation available at: dbt/telegram_medical_pipeline/target/index.html")
         else:
@@ -143,6 +364,7 @@ class DbtRunner:
         steps = [
             ("Debug", self.debug),
             ("Dependencies", self.deps),
+            ("Parse", self.parse),
             ("Run Models", lambda: self.run()),
             ("Run Tests", lambda: self.test()),
             ("Generate Docs", self.docs_generate)
@@ -8,8 +8,11 @@ import logging
 import sys
 from pathlib import Path
 
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+try:
+    # Faster event loop for the Telegram client; not available on Windows
+    import uvloop
+except ImportError:
+    uvloop = None
 
 from app.services.telegram_scraper import TelegramScraper
 from app.services.data_loader import DataLoader
@@ -25,7 +28,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def run_scraping_pipeline(limit_per_channel: int = 100, load_to_db: bool = True):
+async def run_scraping_pipeline(limit_per_channel: int = 100, load_to_db: bool = True,
+                                defer_indexes: bool = False):
     """Run the complete scraping pipeline"""
     try:
         logger.info("Starting Telegram scraping pipeline")
@@ -42,9 +46,15 @@ async def run_scraping_pipeline(limit_per_channel: int = 100, load_to_db: bool =
             logger.info("Step 2: Loading data to PostgreSQL")
             loader = DataLoader()
             stats = loader.load_all_raw_data()
-            loader.create_data_lake_indexes()
+            
+            # Index builds come after all COPYs so they sort the data once
+            if defer_indexes:
+                logger.info("Index creation deferred; it will run on the next load without --defer-indexes")
+            else:
+                loader.create_data_lake_indexes()
             
             final_stats = loader.get_loading_stats()
+            loader.close()
             logger.info(f"Step 2 completed: Data loaded to PostgreSQL")
             logger.info(f"Final stats: {final_stats}")
         else:
@@ -70,6 +80,11 @@ def main():
         action="store_true",
         help="Skip loading data to PostgreSQL"
     )
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="Load data without building indexes (batch several scrapes, build once later)"
+    )
     parser.add_argument(
         "--channels", 
         nargs="+",
@@ -83,10 +98,17 @@ def main():
     
     try:
         # Run the pipeline
-        asyncio.run(run_scraping_pipeline(
+        pipeline = run_scraping_pipeline(
             limit_per_channel=args.limit,
-            load_to_db=not args.skip_db_load
-        ))
+            load_to_db=not args.skip_db_load,
+            defer_indexes=args.defer_indexes
+        )
+        if uvloop is not None:
+            # Replaces the deprecated uvloop.install() event loop policy
+            with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                runner.run(pipeline)
+        else:
+            asyncio.run(pipeline)
         
         print("✅ Scraping pipeline completed successfully!")
         
@@ -2,28 +2,27 @@
 """
 Complete YOLO Detection Pipeline for Telegram Medical Data
 """
-import sys
 import argparse
 import logging
-from pathlib import Path
 
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
-
-from app.services.yolo_detector import YOLODetector
+from app.services.detection_cache import DetectionCache
+from app.services.yolo_detector import YOLODetector, BATCH_SIZE, PRECISIONS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def run_yolo_detection(channel_name: str = None, model_size: str = "n", confidence: float = 0.25):
+def run_yolo_detection(channel_name: str = None, model_size: str = "n", confidence: float = 0.25,
+                       batch_size: int = BATCH_SIZE, precision: str = "fp16"):
     """Run YOLO detection on images"""
     print("🤖 Starting YOLO Image Detection...")
     
     # Initialize detector
     detector = YOLODetector(
         model_size=model_size,
-        confidence_threshold=confidence
+        confidence_threshold=confidence,
+        precision=precision,
+        batch_size=batch_size
     )
     
     # Load model
@@ -32,8 +31,15 @@ def run_yolo_detection(channel_name: str = None, model_size: str = "n", confiden
         print("💡 Please install ultralytics: pip install ultralytics")
         return False
     
+    # Cached results are keyed by model settings so changing --model-size,
+    # --confidence or --precision never serves stale detections. Built after
+    # loading so a CPU fallback to fp32 is reflected in the key
+    detection_cache = DetectionCache(fingerprint=f"yolov8{model_size}:{confidence}:{detector.precision}")
+    detector.detection_cache = detection_cache
+    
     # Process images
     stats = detector.scan_and_process_images(channel_name)
+    detection_cache.save()
     
     print(f"\n📊 Detection Statistics:")
     print(f"  Total images found: {stats['total_images']}")
@@ -66,6 +72,7 @@ def run_detection_loading():
         print(f"\n📊 Loading Statistics:")
         print(f"  Total detection files found: {stats['total_files']}")
         print(f"  Successfully loaded: {stats['loaded_files']}")
+        print(f"  Already loaded: {stats['skipped_files']}")
         print(f"  Failed: {stats['failed_files']}")
         
         if stats['channels']:
@@ -73,6 +80,7 @@ def run_detection_loading():
         
         # Get database stats
         db_stats = loader.get_detection_stats()
+        loader.close()
         if db_stats:
             print(f"\n📊 Database Statistics:")
             print(f"  Total detection records: {db_stats['total_records']}")
@@ -132,6 +140,18 @@ def main():
         default=0.25,
         help="Confidence threshold (default: 0.25)"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Images per YOLO model call (default: {BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default='fp16',
+        help="Inference precision: fp32, fp16 or int8 via TensorRT (default: fp16)"
+    )
     parser.add_argument(
         "--skip-detection",
         action="store_true",
@@ -168,6 +188,8 @@ def main():
     print("🚀 Starting YOLO Detection Pipeline...")
     print(f"  Model size: {args.model_size}")
     print(f"  Confidence threshold: {args.confidence}")
+    print(f"  Batch size: {args.batch_size}")
+    print(f"  Precision: {args.precision}")
     if args.channel:
         print(f"  Target channel: {args.channel}")
     
@@ -183,7 +205,8 @@ def main():
         print("\n" + "="*50)
         print("STEP 1: YOLO Image Detection")
         print("="*50)
-        success = run_yolo_detection(args.channel, args.model_size, args.confidence)
+        success = run_yolo_detection(args.channel, args.model_size, args.confidence,
+                                     args.batch_size, args.precision)
         if not success:
             print("❌ YOLO detection failed")
             return
@@ -4,11 +4,10 @@ Database setup script for Telegram Medical Data Pipeline
 """
 import sys
 import os
+import hashlib
+from contextlib import closing
 from pathlib import Path
 
-# Add the project root to Python path
-sys.path.append(str(Path(__file__).parent.parent))
-
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from app.core.config import settings
@@ -16,27 +15,26 @@ from app.core.config import settings
 def create_database():
     """Create the database if it doesn't exist"""
     try:
-        # Connect to default postgres database
-        conn = psycopg2.connect(
+        # Connect to default postgres database; closing() makes sure the
+        # autocommit connection is released even if a statement fails
+        with closing(psycopg2.connect(
             host="localhost",
             database="postgres",
             user="postgres",
             password="password"
-        )
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        
-        with conn.cursor() as cursor:
-            # Check if database exists
-            cursor.execute("SELECT 1 FROM pg_database WHERE datname = 'telegram_medical'")
-            exists = cursor.fetchone()
+        )) as conn:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
             
-            if not exists:
-                cursor.execute("CREATE DATABASE telegram_medical")
-                print("✅ Database 'telegram_medical' created successfully")
-            else:
-                print("✅ Database 'telegram_medical' already exists")
+            with conn.cursor() as cursor:
+                # Check if database exists
+                cursor.execute("SELECT 1 FROM pg_database WHERE datname = 'telegram_medical'")
+                exists = cursor.fetchone()
                 
-        conn.close()
+                if not exists:
+                    cursor.execute("CREATE DATABASE telegram_medical")
+                    print("✅ Database 'telegram_medical' created successfully")
+                else:
+                    print("✅ Database 'telegram_medical' already exists")
         
     except psycopg2.OperationalError as e:
         print(f"❌ Could not connect to PostgreSQL: {e}")
@@ -45,78 +43,94 @@ def create_database():
         
     return True
 
-def create_tables():
+def create_tables(conn) -> bool:
     """Create the required tables"""
     try:
-        # Connect to our database
-        conn = psycopg2.connect(
-            host="localhost",
-            database="telegram_medical",
-            user="postgres",
-            password="password"
-        )
-        
         # Read and execute the init.sql file
         init_sql_path = Path(__file__).parent.parent / "init.sql"
         
-        if init_sql_path.exists():
-            with open(init_sql_path, 'r') as f:
-                sql_commands = f.read()
-                
-            with conn.cursor() as cursor:
-                cursor.execute(sql_commands)
-                
-            conn.commit()
-            print("✅ Database tables created successfully")
-        else:
+        if not init_sql_path.exists():
             print("❌ init.sql file not found")
             return False
             
-        conn.close()
+        with open(init_sql_path, 'rb') as f:
+            sql_bytes = f.read()
+        fingerprint = hashlib.blake2b(sql_bytes, digest_size=16).digest()
+            
+        with conn.cursor() as cursor:
+            # Skip the DDL entirely if this exact init.sql was already applied
+            cursor.execute("""
+                CREATE SCHEMA IF NOT EXISTS meta;
+                CREATE TABLE IF NOT EXISTS meta.schema_fingerprint (
+                    hash BYTEA PRIMARY KEY,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                SELECT 1 FROM meta.schema_fingerprint WHERE hash = %s;
+            """, (fingerprint,))
+            if cursor.fetchone():
+                conn.commit()
+                print("⏭️ init.sql unchanged since last setup, skipping table creation")
+                return True
+                
+            # The whole script goes to the server as one simple-query message,
+            # so every statement in it costs a single round trip
+            cursor.execute(sql_bytes.decode('utf-8'))
+            cursor.execute(
+                "INSERT INTO meta.schema_fingerprint (hash) VALUES (%s) ON CONFLICT (hash) DO NOTHING",
+                (fingerprint,)
+            )
+            
+        conn.commit()
+        print("✅ Database tables created successfully")
         
     except Exception as e:
+        conn.rollback()
         print(f"❌ Error creating tables: {e}")
         return False
         
     return True
 
-def test_connection():
+def test_connection(conn) -> bool:
     """Test database connection"""
     try:
-        conn = psycopg2.connect(
-            host="localhost",
-            database="telegram_medical",
-            user="postgres",
-            password="password"
-        )
-        
         with conn.cursor() as cursor:
             cursor.execute("SELECT version();")
             version = cursor.fetchone()
             print(f"✅ Connected to PostgreSQL: {version[0]}")
-            
-        conn.close()
         return True
         
     except Exception as e:
         print(f"❌ Connection test failed: {e}")
         return False
 
-def main():
-    """Main setup function"""
+def setup_database():
+    """Create the database and tables, then test the connection"""
     print("🗄️ Setting up PostgreSQL database...")
     
     # Step 1: Create database
     if not create_database():
         return False
         
-    # Step 2: Create tables
-    if not create_tables():
+    # Steps 2 and 3 share one connection to the new database
+    try:
+        conn = psycopg2.connect(
+            host="localhost",
+            database="telegram_medical",
+            user="postgres",
+            password="password"
+        )
+    except psycopg2.OperationalError as e:
+        print(f"❌ Could not connect to database 'telegram_medical': {e}")
         return False
         
-    # Step 3: Test connection
-    if not test_connection():
-        return False
+    with closing(conn):
+        # Step 2: Create tables
+        if not create_tables(conn):
+            return False
+            
+        # Step 3: Test connection
+        if not test_connection(conn):
+            return False
         
     print("🎉 Database setup completed successfully!")
     print("\nNext steps:")
@@ -126,6 +140,9 @@ def main():
     
     return True
 
+def main():
+    """Main setup function"""
+    sys.exit(0 if setup_database() else 1)
+
 if __name__ == "__main__":
-    success = main()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    main() 
\ No newline at end of file